@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+import numpy as np
+
+# The Qt models are benchmarked without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from rankings.triangle import triangular, rankify_improved, get_diff_ranks
+from rankings.helpers import get_normed
+from rankings.difference_search import difference_search
+
+SIZES = [10, 100, 1000, 3000, 10000, 100000]
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+VIEWPORT = (30, 12)  # rows and columns of cells a table window asks for on a repaint
+P7, Q1 = 0.10, 0.15
+BENCHMARKS = {}
+
+
+def benchmark(name, max_size=None):
+    # Registers setup(size), which prepares the inputs outside of the timing and returns the function to time.
+    # Benchmarks building n x n matrices stop at max_size.
+    def register(setup):
+        BENCHMARKS[name] = setup, max_size
+        return setup
+    return register
+
+
+def get_rankings(size):
+    return triangular(0, 10, 5, size, seed=1), triangular(1, 20, 3, size, seed=2)
+
+
+def get_normed_rankings(size):
+    return tuple(get_normed(r) for r in get_rankings(size))
+
+
+def repaint(model):
+    # What a view does on a repaint: ask for the shape, then for the visible cells, here from the middle
+    rows, cols = model.rowCount(), model.columnCount()
+    top, left = max(0, rows // 2 - VIEWPORT[0] // 2), max(0, cols // 2 - VIEWPORT[1] // 2)
+    for row in range(top, min(rows, top + VIEWPORT[0])):
+        for col in range(left, min(cols, left + VIEWPORT[1])):
+            model.data(model.index(row, col))
+
+
+@benchmark('triangular')
+def bench_triangular(size):
+    return lambda: triangular(0, 10, 5, size, seed=0)
+
+
+@benchmark('rankify_improved')
+def bench_rankify_improved(size):
+    r1, _ = get_rankings(size)
+    return lambda: rankify_improved(r1)
+
+
+@benchmark('get_normed')
+def bench_get_normed(size):
+    r1, _ = get_rankings(size)
+    return lambda: get_normed(r1)
+
+
+@benchmark('get_diff_ranks')
+def bench_get_diff_ranks(size):
+    r1_normed, r2_normed = get_normed_rankings(size)
+    return lambda: get_diff_ranks(r1_normed, r2_normed)
+
+
+@benchmark('kendall')
+def bench_kendall(size):
+    from rankings.rank_correlation import kendall
+    _, r1_ranks, r2_ranks, _ = get_diff_ranks(*get_normed_rankings(size))
+    return lambda: kendall(r1_ranks, r2_ranks)
+
+
+@benchmark('difference_search')
+def bench_difference_search(size):
+    r1_normed, r2_normed = get_normed_rankings(size)
+    return lambda: difference_search(r1_normed, r2_normed, P7, Q1, matrices=False)
+
+
+@benchmark('difference_search matrices', max_size=3000)
+def bench_difference_search_matrices(size):
+    r1_normed, r2_normed = get_normed_rankings(size)
+    return lambda: difference_search(r1_normed, r2_normed, P7, Q1)
+
+
+@benchmark('run_pipeline')
+def bench_run_pipeline(size):
+    from rankings.pipeline import run_pipeline
+    rng = np.random.default_rng(0)
+    return lambda: run_pipeline(size, P7, Q1, (0, 10, 5), (1, 20, 3), seed=rng)
+
+
+@benchmark('RankingWorkspace.run')
+def bench_ranking_workspace(size):
+    # After a first run, the peak is what a run allocates in steady state
+    from rankings.workspace import RankingWorkspace
+    workspace, rng = RankingWorkspace(size), np.random.default_rng(0)
+    workspace.run(P7, Q1, (0, 10, 5), (1, 20, 3), seed=rng)
+    return lambda: workspace.run(P7, Q1, (0, 10, 5), (1, 20, 3), seed=rng)
+
+
+@benchmark('compare_rankings 50', max_size=10000)
+def bench_compare_rankings(size):
+    from rankings.bulk import compare_rankings
+    rankings = np.random.default_rng(0).random((50, size))
+    return lambda: compare_rankings(rankings, P7, Q1)
+
+
+@benchmark('PandasModel.data')
+def bench_pandas_model(size):
+    from utils.pandas_table import PandasModel
+    from rankings.pipeline import TABLE_FORMATS
+    model = PandasModel(np.random.default_rng(0).random((size, len(TABLE_FORMATS))), TABLE_FORMATS)
+    return lambda: repaint(model)
+
+
+@benchmark('PandasMainTableModel.data')
+def bench_main_table_model(size):
+    from utils.pandas_table import PandasMainTableModel
+    from rankings.pipeline import TABLE_FORMATS
+    model = PandasMainTableModel(np.random.default_rng(0).random((size, len(TABLE_FORMATS))), TABLE_FORMATS)
+    return lambda: repaint(model)
+
+
+@benchmark('RightAlignTableModel.data', max_size=3000)
+def bench_right_align_model(size):
+    from utils.pandas_table import RightAlignTableModel
+    model = RightAlignTableModel(np.random.default_rng(0).random((size, size)))
+    return lambda: repaint(model)
+
+
+@benchmark('AdvantagesTableModel.data', max_size=10000)
+def bench_advantages_model(size):
+    from utils.pandas_table import AdvantagesTableModel
+    rng = np.random.default_rng(0)
+    model = AdvantagesTableModel(rng.integers(-2, 3, (size, size), dtype=np.int8), rng.random(size))
+    return lambda: repaint(model)
+
+
+def measure(function, repeat):
+    # Best and median time per call over repeat rounds of at least 0.2 s, then the peak memory allocated by
+    # one call (numpy reports its buffers to tracemalloc), in a separate call as tracing slows it down
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    times = [seconds / number for seconds in timer.repeat(repeat, number)]
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'median': statistics.median(times), 'calls': number * repeat, 'peak_bytes': peak}
+
+
+def run(names, sizes, repeat):
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    results = {}
+    for name in names:
+        setup, max_size = BENCHMARKS[name]
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            result = measure(setup(size), repeat)
+            results.setdefault(name, {})[str(size)] = result
+            print(f"{name:28} {size:>7}  {format_seconds(result['seconds']):>10}  "
+                  f"{format_bytes(result['peak_bytes']):>10}", flush=True)
+    return results
+
+
+def get_metadata():
+    from PyQt5.QtCore import QT_VERSION_STR
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'qt': QT_VERSION_STR,
+            'machine': platform.machine(), 'system': platform.system(), 'processor': platform.processor()}
+
+
+def compare(baseline, results, tolerance):
+    # Prints the ratios to the baseline, marking with '!' those above tolerance. Returns the number marked.
+    regressions = 0
+    print(f"\n{'':28} {'size':>7}  {'time':>10}  {'ratio':>6}  {'peak':>10}  {'ratio':>6}")
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            old = baseline['results'].get(name, {}).get(size)
+            if old is None:
+                continue
+            time_ratio = result['seconds'] / old['seconds']
+            peak_ratio = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else 1.
+            marks = ['!' if ratio > tolerance else ' ' for ratio in (time_ratio, peak_ratio)]
+            regressions += marks.count('!')
+            print(f"{name:28} {size:>7}  {format_seconds(result['seconds']):>10}  {time_ratio:5.2f}{marks[0]}  "
+                  f"{format_bytes(result['peak_bytes']):>10}  {peak_ratio:5.2f}{marks[1]}")
+    return regressions
+
+
+def format_seconds(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3g} {unit}'
+    return f'{seconds / 1e-9:.3g} ns'
+
+
+def format_bytes(size):
+    for unit, scale in (('GB', 2 ** 30), ('MB', 2 ** 20), ('kB', 2 ** 10)):
+        if size >= scale:
+            return f'{size / scale:.3g} {unit}'
+    return f'{size} B'
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Time and peak memory of the core math and the Qt models")
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help="benchmarks to run, matched by substring (default: all): " + ', '.join(BENCHMARKS))
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help=f"default: {SIZES}")
+    parser.add_argument('--repeat', type=int, default=5, help="timing rounds per benchmark (default: 5)")
+    parser.add_argument('-o', '--output', help="write the results to this JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help=f"write the results to {BASELINE}")
+    parser.add_argument('--compare', nargs='?', const=BASELINE, metavar='FILE',
+                        help="compare with a results file (default: the baseline)")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="ratio to the baseline above which a result counts as a regression (default: 1.25)")
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    names = [name for name in BENCHMARKS if not args.names or any(part in name for part in args.names)]
+    if not names:
+        parser.error(f"no benchmark matches {args.names}")
+
+    report = {'metadata': get_metadata(), 'results': run(names, args.sizes, args.repeat)}
+    for path in [args.output, BASELINE if args.save_baseline else None]:
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['metadata'] != report['metadata']:
+            print(f"Note: the baseline was recorded with {baseline['metadata']}", file=sys.stderr)
+        return 1 if compare(baseline, report['results'], args.tolerance) else 0
+    return 0
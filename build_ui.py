@@ -0,0 +1,15 @@
+from PyQt5 import uic
+
+# The main window is built from this module when it exists and from the .ui file otherwise. It is generated
+# by the cx_Freeze and PyInstaller builds; run this file after editing the .ui to use it from source too.
+UI_FILE = 'ui/ui/MainPage.ui'
+UI_MODULE = 'ui/main_page.py'
+
+
+def compile_ui(source=UI_FILE, target=UI_MODULE):
+    with open(target, 'w') as f:
+        uic.compileUi(source, f)
+
+
+if __name__ == '__main__':
+    compile_ui()
@@ -1,47 +1,120 @@
+import time
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
 import sys
 import numpy as np
-import pandas as pd
-from PyQt5 import uic
-from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QSizePolicy, QHeaderView
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QMessageBox, QSizePolicy, QHeaderView, QProgressBar,
+                             QPushButton, QFileDialog)
 from PyQt5.QtGui import QIntValidator, QRegExpValidator
-from PyQt5.QtCore import QRegExp
-from utils.triangle import triangular, get_diff_ranks
-from utils.pandas_table import (PandasMainTableModel, RightAlignTableModel,
+from PyQt5.QtCore import QRegExp, QThreadPool, QObject, QEvent
+from utils.pandas_table import (PandasModel, PandasMainTableModel, RightAlignTableModel,
                                 TableWindow, AdvantagesTableModel)
 from utils.set_ranking_window import VisualRankingWindow, ManualRankingWindow
-from utils.helpers import get_float, change_visibility, get_normed
-from utils.difference_search import difference_search
+from rankings.helpers import get_float
+from rankings.difference_search import difference_search_processing, memoized
+from rankings.cache import ArrayCache, DEFAULT_BUDGET
+from rankings.bulk import load_rankings, compare_rankings
+from rankings.incremental import IncrementalRankings
+from rankings.pipeline import run_pipeline, TABLE_COLUMNS, TABLE_FORMATS, PIPELINE_STEPS
+from rankings.timing import Timings, recording, stage, new_profile
+from utils.worker import Job
+from utils.widgets import change_visibility
+
+try:
+    from ui.main_page import Ui_MainWindow
+except ImportError:
+    Ui_MainWindow = None
+
+UI_FILE = 'ui/ui/MainPage.ui'
+
+MATRIX_KINDS = ('diff', 'percent', 'adv')
+MATRIX_BUTTONS = {'diff': '{0}_diff_matrix_button', 'percent': '{0}_diff_percent_matrix_button',
+                  'adv': '{0}_adv_matrix_button'}
+TABLE_TITLES = {'table': "Rankings",
+                (0, 'diff'): "R1 diff matrix", (0, 'percent'): "R1 % matrix", (0, 'adv'): "R1 K-matrix",
+                (1, 'diff'): "R2 diff matrix", (1, 'percent'): "R2 % matrix", (1, 'adv'): "R2 K-matrix",
+                ('compare', 'metric'): "Metric by value matrix", ('compare', 'metric_rank'): "Metric by rank matrix"}
+SIDES = (0, 1)
+
+
+def ui_module_is_stale():
+    # The compiled module is gitignored, so one compiled before the last edit of the .ui file would be loaded
+    # silently. A frozen build ships the module it was built with and no .ui file to compare with.
+    if getattr(sys, 'frozen', False):
+        return False
+    try:
+        return os.path.getmtime(UI_FILE) > os.path.getmtime(sys.modules[Ui_MainWindow.__module__].__file__)
+    except OSError:
+        return False
+
+
+def setup_ui(window):
+    # The module compiled by build_ui.py skips parsing the .ui file at every start, the .ui file is the fallback
+    stale = Ui_MainWindow is not None and ui_module_is_stale()
+    if stale:
+        print(f"{UI_FILE} is newer than the compiled module, loading it instead (run build_ui.py to update it)",
+              file=sys.stderr)
+    if Ui_MainWindow is None or stale:
+        from PyQt5 import uic
+        uic.loadUi(UI_FILE, window)
+        return
+    ui = Ui_MainWindow()
+    ui.setupUi(window)
+    vars(window).update(vars(ui))
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, timing_log=None, profile_path=None, cache_budget=DEFAULT_BUDGET):
         super().__init__()
         self.initialized = False
+        # Results per side and (p7, q1), so that an unchanged side is not computed again
+        self.cache = ArrayCache(cache_budget)
+        # Optional JSON lines log of the stage timings of every job, and cProfile dump of the last generate
+        self.timing_log = timing_log
+        self.profile_path = profile_path
 
-        uic.loadUi('ui/ui/MainPage.ui', self)
+        setup_ui(self)
         self.table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Minimum)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setToolTip("Double-click to scroll through all alternatives")
         self.set_r1_button.hide()
         self.set_r2_button.hide()
         self.set_r1_button_manual.hide()
         self.set_r2_button_manual.hide()
-        self.set_r1_window = VisualRankingWindow(window_title="Set R1 ranking visual")
-        self.set_r2_window = VisualRankingWindow(window_title="Set R2 ranking visual")
-        self.set_r1_window_manual = ManualRankingWindow(window_title="Set R1 ranking manual")
-        self.set_r2_window_manual = ManualRankingWindow(window_title="Set R2 ranking manual")
-        self.show_r1_diff_matrix_window = TableWindow("R1 diff matrix")
-        self.show_r2_diff_matrix_window = TableWindow("R2 diff matrix")
-        self.show_r1_diff_percent_matrix_window = TableWindow("R1 % matrix")
-        self.show_r2_diff_percent_matrix_window = TableWindow("R2 % matrix")
-        self.show_r1_adv_matrix_window = TableWindow("R1 K-matrix")
-        self.show_r2_adv_matrix_window = TableWindow("R2 K-matrix")
-
-        self.r1_diff_matrix_button.clicked.connect(self.show_r1_diff_matrix_window.show)
-        self.r2_diff_matrix_button.clicked.connect(self.show_r2_diff_matrix_window.show)
-        self.r1_diff_percent_matrix_button.clicked.connect(self.show_r1_diff_percent_matrix_window.show)
-        self.r2_diff_percent_matrix_button.clicked.connect(self.show_r2_diff_percent_matrix_window.show)
-        self.r1_adv_matrix_button.clicked.connect(self.show_r1_adv_matrix_window.show)
-        self.r2_adv_matrix_button.clicked.connect(self.show_r2_adv_matrix_window.show)
+
+        # Secondary windows are only built the first time they are needed, see ranking_windows and table_window
+        self.ranking_window_pairs = [None, None]
+        self.table_windows = {}
+        self.table.doubleClicked.connect(lambda: self.show_table_window('table'))
+
+        self.normed = (None, None)
+        self.thresholds = None
+        # Results of the last generate, updated as manual values change, see update_live_metrics
+        self.live = None
+        self.models = {}
+
+        self.thread_pool = QThreadPool.globalInstance()
+        self.job = None
+        self.matrix_jobs = [None, None]
+        # Matrix windows asked for while a generate runs, opened on its rankings once it is done
+        self.pending_kinds = [[], []]
+        self.compare_job = None
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.hide()
+        self.cancel_button.clicked.connect(self.cancel_jobs)
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.statusBar().addPermanentWidget(self.cancel_button)
+
+        for side, name in enumerate(('r1', 'r2')):
+            for kind in MATRIX_KINDS:
+                getattr(self, MATRIX_BUTTONS[kind].format(name)).clicked.connect(
+                    lambda checked, side=side, kind=kind: self.show_matrix_window(side, kind))
         self.r1_diff_matrix_button.setEnabled(False)
         self.r2_diff_matrix_button.setEnabled(False)
         self.r1_diff_percent_matrix_button.setEnabled(False)
@@ -50,6 +123,7 @@ class MainWindow(QMainWindow):
         self.r2_adv_matrix_button.setEnabled(False)
 
         self.generate_button.clicked.connect(self.generate)
+        self.compare_button.clicked.connect(self.compare)
         self.r1_automatic.toggled.connect(lambda state: change_visibility([self.a1_label, self.a1_edit,
                                                                            self.b1_label, self.b1_edit,
                                                                            self.m1_label, self.m1_edit], state))
@@ -60,10 +134,10 @@ class MainWindow(QMainWindow):
                                                                        state))
         self.r2_manual.toggled.connect(lambda state: change_visibility([self.set_r2_button, self.set_r2_button_manual],
                                                                        state))
-        self.set_r1_button.clicked.connect(lambda: self.show_ranking_window(self.set_r1_window))
-        self.set_r2_button.clicked.connect(lambda: self.show_ranking_window(self.set_r2_window))
-        self.set_r1_button_manual.clicked.connect(lambda: self.show_ranking_window(self.set_r1_window_manual))
-        self.set_r2_button_manual.clicked.connect(lambda: self.show_ranking_window(self.set_r2_window_manual))
+        self.set_r1_button.clicked.connect(lambda: self.show_ranking_window(0, 0))
+        self.set_r2_button.clicked.connect(lambda: self.show_ranking_window(1, 0))
+        self.set_r1_button_manual.clicked.connect(lambda: self.show_ranking_window(0, 1))
+        self.set_r2_button_manual.clicked.connect(lambda: self.show_ranking_window(1, 1))
 
         percent_edits = [self.p7_edit, self.q1_edit]
 
@@ -79,147 +153,257 @@ class MainWindow(QMainWindow):
         self.size_edit.setValidator(QIntValidator(2, 1000))
         self.size_edit.editingFinished.connect(self.update_size)
 
-        self.set_r1_window.values_updated.connect(lambda parent: self.update_manual_values(parent,
-                                                                                           self.set_r1_window_manual))
-        self.set_r2_window.values_updated.connect(lambda parent: self.update_manual_values(parent,
-                                                                                           self.set_r2_window_manual))
-
-        self.set_r1_window_manual.button.clicked.connect(lambda: self.update_visual_values(self.set_r1_window_manual,
-                                                                                                  self.set_r1_window))
-        self.set_r2_window_manual.button.clicked.connect(lambda: self.update_visual_values(self.set_r2_window_manual,
-                                                                                           self.set_r2_window))
+    @property
+    def set_r1_window(self):
+        return self.ranking_windows(0)[0]
+
+    @property
+    def set_r2_window(self):
+        return self.ranking_windows(1)[0]
+
+    @property
+    def set_r1_window_manual(self):
+        return self.ranking_windows(0)[1]
+
+    @property
+    def set_r2_window_manual(self):
+        return self.ranking_windows(1)[1]
+
+    def ranking_windows(self, side):
+        if self.ranking_window_pairs[side] is None:
+            name = f'R{side + 1}'
+            visual = VisualRankingWindow(window_title=f"Set {name} ranking visual")
+            manual = ManualRankingWindow(window_title=f"Set {name} ranking manual")
+            visual.values_updated.connect(lambda parent: self.update_manual_values(parent, manual))
+            visual.values_updated.connect(lambda parent: self.update_live_metrics(side, parent))
+            manual.button.clicked.connect(lambda: self.update_visual_values(manual, visual))
+            self.ranking_window_pairs[side] = visual, manual
+            self.update_size()
+        return self.ranking_window_pairs[side]
+
+    def table_window(self, key):
+        if key not in self.table_windows:
+            self.table_windows[key] = TableWindow(TABLE_TITLES[key])
+        return self.table_windows[key]
+
+    def created_windows(self):
+        pairs = [pair for pair in self.ranking_window_pairs if pair is not None]
+        return [window for pair in pairs for window in pair] + list(self.table_windows.values())
 
     def update_visual_values(self, parent, child):
-        if round(parent.normed_values[:parent.size].sum(), 4) != 1:
+        normed_values = parent.normed_values()
+        if round(normed_values.sum(), 4) != 1:
             raise ValueError("Sum of all values should be equal to 1")
 
-        values = (1 / parent.normed_values[:parent.size].max()) * parent.normed_values[:parent.size]
+        child.set_values(normed_values / normed_values.max())
+
+    def update_manual_values(self, parent, child):
+        child.set_normed_values(parent.normed_values())
 
-        for i, value in enumerate(values):
-            child.sliders[i].abs_value = value
-            child.sliders[i].setValue(child.sliders[i].abs_value * child.sliders[i].width())
+    def update_live_metrics(self, side, parent):
+        # The metrics follow a manual ranking as it is edited, from the changed values only
+        if self.live is None or not (self.r1_manual, self.r2_manual)[side].isChecked() or parent.size != self.live.size:
+            return
+        values = parent.values()
+        for i in np.flatnonzero(values != self.live.values[side]):
+            self.live.update(side, i, values[i])
+        self.show_metrics(self.live.metrics())
+
+    def show_metrics(self, result):
+        self.metric_value_result.setText('{0:5.4f}'.format(result['metric']))
+        self.metric_rank_result.setText(str(result['metric_rank'] / 2))
+        self.kendall_distance_result.setText(str(result['kendall_distance']))
+        self.kendall_tau_result.setText('{0:5.4f}'.format(result['kendall_tau_b']))
+        self.spearman_rho_result.setText('{0:5.4f}'.format(result['spearman_rho']))
+
+    def show_table_window(self, key):
+        window = self.table_window(key)
+        if key in self.models and window.model() is not self.models[key]:
+            window.setModel(self.models[key])
+        window.show()
 
-        child.update_values()
+    def show_matrix_window(self, side, kind):
+        if self.job is not None:
+            self.pending_kinds[side].append(kind)
+        elif (side, kind) in self.models:
+            self.show_table_window((side, kind))
+        elif self.matrix_jobs[side] is None:
+            self.start_matrix_job(side, [kind])
+        else:
+            self.matrix_jobs[side].kinds.append(kind)
 
+    def start_matrix_job(self, side, kinds):
+        p7, q1 = self.thresholds
+        self.matrix_jobs[side] = Job(compute_matrices, self.normed[side], p7, q1, self.cache, timings=Timings())
+        self.matrix_jobs[side].side = side
+        self.matrix_jobs[side].kinds = kinds
+        self.start_job(self.matrix_jobs[side], self.matrices_finished)
 
-    def update_manual_values(self, parent, child):
-        values = np.array([s.abs_value for s in parent.sliders[:parent.size]])
-        sum_values = sum(values)
-        normed_values = values / sum_values if sum_values else np.ones(parent.size) / parent.size
-        for i, value in enumerate(normed_values):
-            child.normed_values[i] = value
-            child.alternatives_layout.itemAt(i).widget().value_label.setText(f'{value:0.4f}')
-
-    def show_ranking_window(self, window):
+    def matrices_finished(self, job, matrices):
+        if job is not self.matrix_jobs[job.side]:
+            return
+        self.job_done(job)
+        with recording(job.timings), stage('matrix models'):
+            self.set_matrix_models(job.side, matrices)
+            for kind in job.kinds:
+                self.show_table_window((job.side, kind))
+        self.report_timings(job, f"R{job.side + 1} matrices")
+
+    def set_matrix_models(self, side, matrices):
+        diff_matrix, diff_percents, advantages_matrix, geo_mean = matrices
+        self.set_model((side, 'diff'), RightAlignTableModel(diff_matrix))
+        self.set_model((side, 'percent'), RightAlignTableModel(diff_percents))
+        self.set_model((side, 'adv'), AdvantagesTableModel(advantages_matrix, geo_mean))
+
+    def set_model(self, key, model):
+        # Windows that are open switch to the new model right away, the others pick it up when shown again
+        self.models[key] = model
+        if key in self.table_windows and self.table_windows[key].isVisible():
+            self.table_windows[key].setModel(model)
+
+    def show_ranking_window(self, side, manual):
         self.update_size()
-        window.show()
+        self.ranking_windows(side)[manual].show()
 
     def update_size(self):
         if not (self.r1_manual.isChecked() or self.r2_manual.isChecked()) or self.size_edit.hasFocus():
             return
 
         size = int(self.size_edit.text())
-        if size > 10:
-            raise ValueError("In manual mode, size can't be > 10")
-
-        self.set_r1_window.update_size(size)
-        self.set_r2_window.update_size(size)
-        self.set_r1_window_manual.update_size(size)
-        self.set_r2_window_manual.update_size(size)
+        for pair in self.ranking_window_pairs:
+            for window in pair or ():
+                window.update_size(size)
 
     def closeEvent(self, event):
-        self.set_r1_window.close()
-        self.set_r2_window.close()
-        self.set_r1_window_manual.close()
-        self.set_r2_window_manual.close()
-        self.show_r1_diff_matrix_window.close()
-        self.show_r2_diff_matrix_window.close()
-        self.show_r1_diff_percent_matrix_window.close()
-        self.show_r2_diff_percent_matrix_window.close()
-        self.show_r1_adv_matrix_window.close()
-        self.show_r2_adv_matrix_window.close()
+        for job in self.running_jobs():
+            job.cancel()
+        for window in self.created_windows():
+            window.close()
 
-    def generate(self):
-        self.update_size()
+    def get_inputs(self):
         size = int(self.size_edit.text())
 
         if size < 2:
             raise ValueError("Size should be > 1")
 
-        p7, q1 = get_float(self.p7_edit.text()), get_float(self.q1_edit.text())
-        if p7 + q1 > 1:
-            raise ValueError("p7 + q1 should be <= 1")
+        p7, q1 = self.get_thresholds()
 
+        # A manual ranking is passed as its values, an automatic one as the (a, b, m) triangle to sample from
         if self.r1_manual.isChecked():
-            r1 = np.array([slider.abs_value for slider in self.set_r1_window.sliders[:size]])
+            r1_source = self.set_r1_window.values()
         else:
-            a1, b1, m1 = get_float(self.a1_edit.text()), get_float(self.b1_edit.text()), get_float(self.m1_edit.text())
-            r1 = triangular(a1, b1, m1, size)
+            r1_source = get_float(self.a1_edit.text()), get_float(self.b1_edit.text()), get_float(self.m1_edit.text())
 
         if self.r2_manual.isChecked():
-            r2 = np.array([slider.abs_value for slider in self.set_r2_window.sliders[:size]])
+            r2_source = self.set_r2_window.values()
         else:
-            a2, b2, m2 = get_float(self.a2_edit.text()), get_float(self.b2_edit.text()), get_float(self.m2_edit.text())
-            r2 = triangular(a2, b2, m2, size)
-
-        r1_normed = get_normed(r1)
-        r2_normed = get_normed(r2)
-
-        diff, r1_ranks, r2_ranks, diff_ranks = get_diff_ranks(r1_normed, r2_normed)
-        metric = diff.sum()
-        metric_rank = diff_ranks.sum()
-
-        r1_difference_search, r2_difference_search = difference_search(r1_normed, r2_normed, p7, q1)
-        r1_diff_matrix, r1_diff_percents, r1_advantages_matrix, r1_geo_mean, r1_geo_mean_normed = r1_difference_search
-        r2_diff_matrix, r2_diff_percents, r2_advantages_matrix, r2_geo_mean, r2_geo_mean_normed = r2_difference_search
-
-        data = {'R1': r1, 'R2': r2, 'R1_n': r1_normed, 'R1_n*': r1_geo_mean_normed,
-                'R2_n': r2_normed, 'R2_n*': r2_geo_mean_normed,
-                'D_n': diff, 'R1_r': r1_ranks, 'R2_r': r2_ranks, 'D_r': diff_ranks}
-        df = pd.DataFrame(data=data)
-        df['R1_n'] = df['R1_n'].map(lambda x: '{0:5.4f}'.format(x))
-        df['R2_n'] = df['R2_n'].map(lambda x: '{0:5.4f}'.format(x))
-        df['D_n'] = df['D_n'].map(lambda x: '{0:5.4f}'.format(x))
-        metric_value = '{0:5.4f}'.format(metric)
-        df['R1'] = df['R1'].map(lambda x: '{0:5.2f}'.format(x))
-        df['R2'] = df['R2'].map(lambda x: '{0:5.2f}'.format(x))
-        df['R1_n*'] = df['R1_n*'].map(lambda x: '{0:5.4f}'.format(x))
-        df['R2_n*'] = df['R2_n*'].map(lambda x: '{0:5.4f}'.format(x))
-        # df['|'] = ""
-        # model = PandasMainTableModel(df[['R1', 'R2', '|', 'R1_n', 'R1_n*', '|',
-        #                                  'R2_n', 'R2_n*', '|', 'D_n', 'R1_r', 'R2_r', 'D_r']])
-        model = PandasMainTableModel(df)
-        self.table.setModel(model)
-        self.table.resizeColumnsToContents()
-
-        r1_diff_matrix = r1_diff_matrix.applymap(lambda x: '{0:5.4f}'.format(x))
-        r1_diff_model = RightAlignTableModel(r1_diff_matrix)
-        self.show_r1_diff_matrix_window.setModel(r1_diff_model)
-
-        r2_diff_matrix = r2_diff_matrix.applymap(lambda x: '{0:5.4f}'.format(x))
-        r2_diff_model = RightAlignTableModel(r2_diff_matrix)
-        self.show_r2_diff_matrix_window.setModel(r2_diff_model)
-
-        r1_diff_percent_matrix = r1_diff_percents.applymap(lambda x: '{0:5.4f}'.format(x))
-        r1_diff_percent_model = RightAlignTableModel(r1_diff_percent_matrix)
-        self.show_r1_diff_percent_matrix_window.setModel(r1_diff_percent_model)
-
-        r2_diff_percent_matrix = r2_diff_percents.applymap(lambda x: '{0:5.4f}'.format(x))
-        r2_diff_percent_model = RightAlignTableModel(r2_diff_percent_matrix)
-        self.show_r2_diff_percent_matrix_window.setModel(r2_diff_percent_model)
-
-        r1_adv_matrix = r1_advantages_matrix.applymap(lambda x: '{0:5.2f}'.format(x))
-        r1_adv_matrix['G_mean'] = r1_geo_mean.apply(lambda x: '{0:5.4f}'.format(x))
-        r1_adv_model = AdvantagesTableModel(r1_adv_matrix)
-        self.show_r1_adv_matrix_window.setModel(r1_adv_model)
-
-        r2_adv_matrix = r2_advantages_matrix.applymap(lambda x: '{0:5.2f}'.format(x))
-        r2_adv_matrix['G_mean'] = r2_geo_mean.apply(lambda x: '{0:5.4f}'.format(x))
-        r2_adv_model = AdvantagesTableModel(r2_adv_matrix)
-        self.show_r2_adv_matrix_window.setModel(r2_adv_model)
-
-        self.metric_value_result.setText(str(metric_value))
-        self.metric_rank_result.setText(str(metric_rank / 2))
+            r2_source = get_float(self.a2_edit.text()), get_float(self.b2_edit.text()), get_float(self.m2_edit.text())
+
+        return size, p7, q1, r1_source, r2_source
+
+    def get_thresholds(self):
+        p7, q1 = get_float(self.p7_edit.text()), get_float(self.q1_edit.text())
+        if p7 + q1 > 1:
+            raise ValueError("p7 + q1 should be <= 1")
+        return p7, q1
+
+    def running_jobs(self):
+        return [job for job in [self.job, *self.matrix_jobs, self.compare_job] if job is not None]
+
+    def start_job(self, job, finished):
+        job.signals.progress.connect(self.job_progress)
+        job.signals.finished.connect(finished)
+        job.signals.failed.connect(self.job_failed)
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        job.start(self.thread_pool)
+        return job
+
+    def job_done(self, job):
+        if job is self.job:
+            self.job = None
+        if job is self.compare_job:
+            self.compare_job = None
+        self.matrix_jobs = [None if matrix_job is job else matrix_job for matrix_job in self.matrix_jobs]
+
+        if not self.running_jobs():
+            self.progress_bar.hide()
+            self.cancel_button.hide()
+            self.statusBar().clearMessage()
+
+    def job_progress(self, job, step, steps, stage):
+        if job not in self.running_jobs():
+            return
+        self.progress_bar.setMaximum(steps)
+        self.progress_bar.setValue(step)
+        self.statusBar().showMessage(stage)
+
+    def job_failed(self, job, exc_info):
+        if job not in self.running_jobs():
+            return
+        if job is self.job:
+            self.pending_kinds = [[], []]
+        self.job_done(job)
+        raise exc_info[1].with_traceback(exc_info[2])
+
+    def cancel_jobs(self):
+        for job in self.running_jobs():
+            job.cancel()
+            self.job_done(job)
+        self.pending_kinds = [[], []]
+        self.statusBar().showMessage("Cancelled", 2000)
+
+    def generate(self):
+        self.update_size()
+        size, p7, q1, r1_source, r2_source = self.get_inputs()
+        matrix_sides = sorted({key[0] for key, window in self.table_windows.items()
+                               if key[0] in SIDES and window.isVisible()})
+
+        # A new click supersedes whatever is still running instead of queueing behind it. The matrix windows
+        # that were asked for open on the new rankings.
+        for job in [self.job, *self.matrix_jobs]:
+            if job is not None:
+                job.cancel()
+        for side, job in enumerate(self.matrix_jobs):
+            if job is not None:
+                self.pending_kinds[side] += job.kinds
+        self.matrix_jobs = [None, None]
+        timings = Timings(new_profile(self.profile_path))
+        self.job = self.start_job(Job(compute_rankings, size, p7, q1, r1_source, r2_source, matrix_sides,
+                                      self.cache, timings=timings), self.generate_finished)
+
+    def generate_finished(self, job, result):
+        if job is not self.job:
+            return
+        self.job_done(job)
+
+        with recording(job.timings):
+            with stage('table models'):
+                model = PandasMainTableModel(result['table'], TABLE_FORMATS, TABLE_COLUMNS)
+                self.table.setModel(model)
+                self.set_model('table', PandasModel(result['table'], TABLE_FORMATS, TABLE_COLUMNS))
+            with stage('resizing columns'):
+                self.table.resizeColumnsToContents()
+
+            # The n x n matrices are only built once one of their windows asks for them
+            self.normed = result['normed']
+            self.thresholds = result['thresholds']
+            for key in [key for key in self.models if key[0] in SIDES]:
+                del self.models[key]
+            with stage('matrix models'):
+                for side, matrices in result['matrices'].items():
+                    self.set_matrix_models(side, matrices)
+            for side, kinds in enumerate(self.pending_kinds):
+                if side in result['matrices']:
+                    for kind in kinds:
+                        self.show_table_window((side, kind))
+                elif kinds:
+                    self.start_matrix_job(side, kinds)
+            self.pending_kinds = [[], []]
+
+        self.live = result['live']
+        self.show_metrics(result)
 
         if not self.initialized:
             self.initialized = True
@@ -229,6 +413,64 @@ class MainWindow(QMainWindow):
             self.r2_diff_percent_matrix_button.setEnabled(True)
             self.r1_adv_matrix_button.setEnabled(True)
             self.r2_adv_matrix_button.setEnabled(True)
+        self.report_timings(job, "Generated")
+
+    def compare(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Rankings to compare", "",
+                                              "Rankings, one per line (*.csv *.npy *.npz);;All files (*)")
+        if not path:
+            return
+        rankings = load_rankings(path)
+        p7, q1 = self.get_thresholds()
+        if self.compare_job is not None:
+            self.compare_job.cancel()
+        self.compare_job = self.start_job(Job(compute_comparison, rankings, p7, q1, timings=Timings()),
+                                          self.compare_finished)
+
+    def compare_finished(self, job, result):
+        if job is not self.compare_job:
+            return
+        self.job_done(job)
+        with recording(job.timings), stage('comparison models'):
+            self.set_model(('compare', 'metric'), RightAlignTableModel(result['metric']))
+            self.set_model(('compare', 'metric_rank'), RightAlignTableModel(result['metric_rank'] / 2, '{0:g}'))
+            self.show_table_window(('compare', 'metric'))
+            self.show_table_window(('compare', 'metric_rank'))
+        self.report_timings(job, f"Compared {len(result['metric'])} rankings")
+
+    def report_timings(self, job, done):
+        cache = self.cache.stats()
+        self.statusBar().showMessage(f"{done} in {job.timings.total() * 1000:.1f} ms: {job.timings.summary()} | "
+                                     f"cache: {cache['hits']} hits, {cache['misses']} misses")
+        if self.timing_log:
+            job.timings.write_log(self.timing_log, job=done, cache=cache)
+        if self.profile_path:
+            job.timings.dump_profile(self.profile_path)
+
+
+def compute_matrices(r_normed, p7, q1, cache, report, step=0, steps=1):
+    report(step, steps, "Building matrices")
+    diff_matrix, diff_percents, advantages_matrix, geo_mean, _ = memoized(difference_search_processing, r_normed,
+                                                                          p7, q1, cache)
+    return diff_matrix, diff_percents, advantages_matrix, geo_mean
+
+
+def compute_rankings(size, p7, q1, r1_source, r2_source, matrix_sides, cache, report):
+    steps = PIPELINE_STEPS + len(matrix_sides)
+    result = run_pipeline(size, p7, q1, r1_source, r2_source, report=lambda step, stage: report(step, steps, stage),
+                          cache=cache)
+    with stage('matrices'):
+        result['matrices'] = {side: compute_matrices(result['normed'][side], p7, q1, cache, report, step, steps)
+                              for step, side in enumerate(matrix_sides, PIPELINE_STEPS)}
+    result['thresholds'] = (p7, q1)
+    with stage('live results'):
+        result['live'] = IncrementalRankings(result['table'][:, 0], result['table'][:, 1], p7, q1)
+    return result
+
+
+def compute_comparison(rankings, p7, q1, report):
+    report(0, 1, f"Comparing {len(rankings)} rankings")
+    return compare_rankings(rankings, p7, q1)
 
 
 def except_hook(type, value, tback):
@@ -242,10 +484,46 @@ def except_hook(type, value, tback):
     print(traceback.format_exception(type, value, tback))
 
 
+class FirstPaint(QObject):
+    # Reports the startup timings once the window has been painted for the first time
+    def __init__(self, timings, output):
+        super().__init__()
+        self.timings = timings
+        self.output = output
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            obj.removeEventFilter(self)
+            self.timings['first_paint'] = time.perf_counter() - STARTED
+            report_startup(self.timings, self.output)
+        return False
+
+
+def report_startup(timings, output):
+    print('Startup: ' + ', '.join(f'{stage} {seconds:.3f} s' for stage, seconds in timings.items()), file=sys.stderr)
+    if output != '-':
+        with open(output, 'a') as f:
+            f.write(json.dumps(timings) + '\n')
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="Rankings Generator")
+    parser.add_argument('--profile-startup', nargs='?', const='-', metavar='FILE',
+                        help="print the time to the first paint, and append it as JSON to FILE if given")
+    parser.add_argument('--timing-log', metavar='FILE', help="append the stage timings of every run to FILE as JSON")
+    parser.add_argument('--profile', metavar='FILE', help="dump a cProfile of the last generate to FILE")
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_BUDGET / 2 ** 20,
+                        help="memory budget of the results cache in MB (default: %(default)g)")
+    args, qt_args = parser.parse_known_args()
+
     sys.excepthook = except_hook
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    timings = {'imports': time.perf_counter() - STARTED}
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(args.timing_log, args.profile, int(args.cache_mb * 2 ** 20))
     window.setWindowTitle("Rankings Generator")
+    timings['window'] = time.perf_counter() - STARTED
+    if args.profile_startup:
+        first_paint = FirstPaint(timings, args.profile_startup)
+        window.installEventFilter(first_paint)
     window.show()
     sys.exit(app.exec_())
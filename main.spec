@@ -1,5 +1,9 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+from build_ui import compile_ui
+
+compile_ui()
+
 block_cipher = None
 
 
@@ -7,7 +11,7 @@ a = Analysis(['main.py'],
              pathex=['D:\\Dev\\triangle-rankings'],
              binaries=[],
              datas=[('ui/ui/MainPage.ui', 'ui/ui/')],
-             hiddenimports=['pkg_resources.py2_warn'],
+             hiddenimports=['pkg_resources.py2_warn', 'ui.main_page'],
              hookspath=[],
              runtime_hooks=[],
              excludes=['scipy', 'matplotlib'],
@@ -0,0 +1,4 @@
+import sys
+from rankings.cli import main
+
+sys.exit(main())
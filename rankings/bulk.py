@@ -0,0 +1,133 @@
+import numpy as np
+from rankings.triangle import get_diff_ranks, rankify_improved
+from rankings.helpers import get_normed
+from rankings.difference_search import difference_search, geo_mean_vector
+from rankings.pipeline import TABLE_COLUMNS
+from rankings.rank_correlation import rank_metrics
+from rankings.replications import check_parameters, METRICS
+from rankings.timing import timed
+
+# Per alternative columns are (pairs, n) arrays named as in TABLE_COLUMNS, the metrics (pairs,) arrays
+METRIC_COLUMNS = METRICS
+METRIC_FORMATS = ['{0:.6f}', '{0}', '{0}', '{0:.6f}', '{0:.6f}']
+
+
+def read_csv(path):
+    # A 2-D array of the lines of a csv file, skipping a header line if the file starts with one
+    with open(path) as f:
+        first = f.readline().split(',')[0]
+    try:
+        float(first)
+        header = 0
+    except ValueError:
+        header = 1
+    return np.loadtxt(path, delimiter=',', skiprows=header, ndmin=2)
+
+
+def load_pairs(path):
+    # Ranking pairs as a (pairs, 2, n) array, from
+    #   .npy: that array, memory-mapped so that files larger than memory are read a chunk at a time
+    #   .npz: that array as 'pairs', or two (pairs, n) arrays 'r1' and 'r2'
+    #   .csv: one pair per line, the n values of R1 then the n values of R2, with an optional header line
+    if path.endswith('.npy'):
+        pairs = np.load(path, mmap_mode='r')
+    elif path.endswith('.npz'):
+        with np.load(path) as data:
+            pairs = data['pairs'] if 'pairs' in data.files else np.stack([data['r1'], data['r2']], axis=1)
+    elif path.endswith('.csv'):
+        values = read_csv(path)
+        if values.shape[1] % 2:
+            raise ValueError("A line should hold as many R1 values as R2 values")
+        pairs = values.reshape(len(values), 2, -1)
+    else:
+        raise ValueError(f"Unknown input format: {path}")
+
+    if pairs.ndim != 3 or pairs.shape[1] != 2:
+        raise ValueError(f"Pairs should be a (pairs, 2, n) array, not {pairs.shape}")
+    return pairs
+
+
+@timed
+def evaluate_pairs(r1, r2, p7, q1):
+    # The main table columns and the METRIC_COLUMNS of every pair of rows of two (pairs, n) arrays, as a dict of
+    # arrays. Same computation as run_pipeline, done on whole 2-D arrays.
+    r1, r2 = np.asarray(r1, dtype=np.float64), np.asarray(r2, dtype=np.float64)
+    if r1.shape != r2.shape or r1.ndim != 2:
+        raise ValueError("R1 and R2 should be (pairs, n) arrays of the same shape")
+    check_parameters(r1.shape[1], p7, q1)
+
+    r1_normed = get_normed(r1)
+    r2_normed = get_normed(r2)
+    diff, r1_ranks, r2_ranks, diff_ranks = get_diff_ranks(r1_normed, r2_normed)
+    (_, r1_geo_mean_normed), (_, r2_geo_mean_normed) = difference_search(r1_normed, r2_normed, p7, q1,
+                                                                         matrices=False)
+
+    columns = [r1, r2, r1_normed, r1_geo_mean_normed, r2_normed, r2_geo_mean_normed, diff, r1_ranks, r2_ranks,
+               diff_ranks]
+    result = dict(zip(TABLE_COLUMNS, columns))
+    result.update(metric=diff.sum(axis=-1), metric_rank=diff_ranks.sum(axis=-1))
+    result.update(rank_metrics(r1_ranks, r2_ranks))
+    return result
+
+
+def iter_pair_results(pairs, p7, q1, chunk_size=None):
+    # evaluate_pairs over a (pairs, 2, n) array a chunk of pairs at a time, yielding (first pair, result)
+    n = pairs.shape[-1]
+    chunk_size = chunk_size or max(1, 2 ** 18 // n)
+    for start in range(0, len(pairs), chunk_size):
+        chunk = np.asarray(pairs[start:start + chunk_size], dtype=np.float64)
+        yield start, evaluate_pairs(chunk[:, 0], chunk[:, 1], p7, q1)
+
+
+def long_columns(start, result):
+    # A chunk of results as columns with one row per (pair, alternative), the metrics repeated on every row
+    pairs, n = result['R1'].shape
+    columns = [np.repeat(np.arange(start, start + pairs), n), np.tile(np.arange(n), pairs)]
+    columns += [result[name].ravel() for name in TABLE_COLUMNS]
+    columns += [np.repeat(result[name], n) for name in METRIC_COLUMNS]
+    return columns
+
+
+def load_rankings(path):
+    # k rankings of the same alternatives as a (k, n) array, from a .npy array (memory-mapped), a .npz with it
+    # as 'rankings', or a .csv with one ranking per line and an optional header line
+    if path.endswith('.npy'):
+        rankings = np.load(path, mmap_mode='r')
+    elif path.endswith('.npz'):
+        with np.load(path) as data:
+            rankings = data['rankings']
+    elif path.endswith('.csv'):
+        rankings = read_csv(path)
+    else:
+        raise ValueError(f"Unknown input format: {path}")
+
+    if rankings.ndim != 2 or len(rankings) < 2 or rankings.shape[1] < 2:
+        raise ValueError(f"Rankings should be a (k, n) array of at least 2 rankings of 2 alternatives, "
+                         f"not {rankings.shape}")
+    return rankings
+
+
+@timed
+def compare_rankings(rankings, p7, q1, block_rows=None):
+    # Every ranking of a (k, n) array against every other: the (k, k) matrices of metric and metric_rank, the
+    # sums of |R_i,n - R_j,n| and of |R_i,r - R_j,r|. Each ranking is normed, ranked and searched once, the
+    # matrices are then filled block_rows rows at a time, each block taking block_rows x k x n values.
+    rankings = np.asarray(rankings, dtype=np.float64)
+    if rankings.ndim != 2 or len(rankings) < 2:
+        raise ValueError("Rankings should be a (k, n) array of at least 2 rankings")
+    k, n = rankings.shape
+    check_parameters(n, p7, q1)
+
+    normed = get_normed(rankings)
+    ranks = rankify_improved(normed) - 1
+    _, geo_mean_normed = geo_mean_vector(normed, p7, q1)
+
+    block_rows = block_rows or max(1, 2 ** 22 // (k * n))
+    metric = np.empty((k, k))
+    metric_rank = np.empty((k, k))
+    for start in range(0, k, block_rows):
+        rows = slice(start, start + block_rows)
+        metric[rows] = np.absolute(normed[rows, None] - normed).sum(axis=-1)
+        metric_rank[rows] = np.absolute(ranks[rows, None] - ranks).sum(axis=-1)
+    return {'normed': normed, 'ranks': ranks, 'geo_mean_normed': geo_mean_normed, 'metric': metric,
+            'metric_rank': metric_rank}
@@ -0,0 +1,63 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_BUDGET = 256 * 2 ** 20
+
+
+def array_key(a, *args):
+    # Key of an array by content, so that equal rankings built separately share an entry
+    a = np.ascontiguousarray(a, dtype=np.float64)
+    return (hashlib.blake2b(a.data, digest_size=16).hexdigest(), a.shape) + args
+
+
+class ArrayCache:
+    # LRU cache of tuples of arrays, bounded by the bytes of the arrays it holds rather than by their count, as
+    # one n x n entry can outweigh thousands of vectors. Cached arrays are read-only, since they are shared
+    # by every caller. Used from the worker threads, hence the lock; values are computed outside of it.
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+
+        value = tuple(compute())
+        for a in value:
+            a.setflags(write=False)
+        size = sum(a.nbytes for a in value)
+        with self.lock:
+            if key not in self.entries and size <= self.budget:
+                self.entries[key] = value, size
+                self.nbytes += size
+                self.evict()
+        return value
+
+    def evict(self):
+        while self.nbytes > self.budget:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.nbytes -= size
+
+    def resize(self, budget):
+        with self.lock:
+            self.budget = budget
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'nbytes': self.nbytes,
+                'budget': self.budget}
@@ -0,0 +1,303 @@
+import argparse
+import json
+import sys
+import numpy as np
+from rankings.helpers import get_float, get_normed
+from rankings.pipeline import run_pipeline, get_ranking, TABLE_COLUMNS, TABLE_FORMATS
+from rankings.difference_search import geo_mean_sweep, threshold_grid
+from rankings.replications import (run_replications, run_adaptive, iter_batches, check_parameters, triangle_grid,
+                                   sweep_triangles, Summary)
+from rankings.bulk import (load_pairs, load_rankings, iter_pair_results, long_columns, compare_rankings,
+                           METRIC_COLUMNS, METRIC_FORMATS)
+from rankings.timing import Timings, recording, stage, new_profile
+
+
+def add_inputs(parser, sides=(1, 2), grid=False, triangles=False):
+    # Same inputs, and defaults, as the main window. With grid, p7 and q1 take lists of values, with
+    # triangles, so do a, b and m.
+    parser.add_argument('--size', type=int, default=10, help="number of alternatives (default: 10)")
+    if grid:
+        for name in ('p7', 'q1'):
+            parser.add_argument(f'--{name}', type=get_float, nargs='+', default=list(np.linspace(0, .5, 11)),
+                                help="values of the grid (default: 0 to 0.5 by 0.05)")
+    else:
+        parser.add_argument('--p7', type=get_float, default=0.10, help="default: 0.10")
+        parser.add_argument('--q1', type=get_float, default=0.15, help="default: 0.15")
+    for side in sides:
+        for name, default in (('a', 0.), ('b', 10.), ('m', 5.)):
+            parser.add_argument(f'--{name}{side}', type=get_float, default=[default] if triangles else default,
+                                nargs='+' if triangles else None, help=f"triangle of R{side} (default: {default:g})")
+    parser.add_argument('--seed', type=int, help="seed of the random generator, for reproducible runs")
+    parser.add_argument('-o', '--output', default='-', help="'-' for stdout (default), a .csv or a .npz file")
+    parser.add_argument('--timing-log', metavar='FILE', help="append the stage timings of the run to FILE as JSON")
+    parser.add_argument('--profile', metavar='FILE', help="dump a cProfile of the run to FILE")
+
+
+def add_file_inputs(parser, input_help):
+    # Inputs of the commands reading their rankings from a file
+    parser.add_argument('input', help=input_help)
+    parser.add_argument('--p7', type=get_float, default=0.10, help="default: 0.10")
+    parser.add_argument('--q1', type=get_float, default=0.15, help="default: 0.15")
+    parser.add_argument('-o', '--output', default='-', help="'-' for stdout (default), a .csv or a .npz file")
+    parser.add_argument('--timing-log', metavar='FILE', help="append the stage timings of the run to FILE as JSON")
+    parser.add_argument('--profile', metavar='FILE', help="dump a cProfile of the run to FILE")
+
+
+def add_rank_metrics_option(parser):
+    parser.add_argument('--no-rank-metrics', action='store_true',
+                        help="skip the Kendall and Spearman metrics, the slowest part of a replication")
+
+
+def write_columns(path, names, columns, formats=None):
+    if path.endswith('.npz'):
+        np.savez(path, **dict(zip(names, columns)))
+    else:
+        write_column_batches(path, names, [columns], formats)
+
+
+def write_column_batches(path, names, batches, formats=None):
+    # write_columns for an iterable of batches of columns, each written out as soon as it is produced
+    if not (path == '-' or path.endswith('.csv')):
+        raise ValueError(f"Unknown output format: {path}" if not path.endswith('.npz') else
+                         "Only a .csv file or stdout can be written batch by batch")
+    formats = formats or ['{0}'] * len(names)
+    f = sys.stdout if path == '-' else open(path, 'w')
+    try:
+        if path == '-':
+            print('\t'.join(names), file=f)
+        else:
+            print(','.join(names), file=f)
+        for columns in batches:
+            if path == '-':
+                for row in zip(*columns):
+                    print('\t'.join(fmt.format(value) for fmt, value in zip(formats, row)), file=f)
+            else:
+                np.savetxt(f, np.column_stack(columns), fmt='%.17g', delimiter=',')
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def generate(args):
+    manual = [np.array(values) for values in (args.r1, args.r2) if values is not None]
+    size = len(manual[0]) if manual else args.size
+    if any(len(values) != size for values in manual):
+        raise ValueError("R1 and R2 should have the same number of values")
+    check_parameters(size, args.p7, args.q1)
+
+    r1_source = (args.a1, args.b1, args.m1) if args.r1 is None else np.array(args.r1)
+    r2_source = (args.a2, args.b2, args.m2) if args.r2 is None else np.array(args.r2)
+
+    result = run_pipeline(size, args.p7, args.q1, r1_source, r2_source, seed=args.seed)
+    columns = list(result['table'].T)
+    with stage('writing output'):
+        if args.output.endswith('.npz'):
+            write_columns(args.output, TABLE_COLUMNS + METRIC_COLUMNS,
+                          columns + [result[name] for name in METRIC_COLUMNS])
+        else:
+            write_columns(args.output, TABLE_COLUMNS, columns, TABLE_FORMATS)
+
+    print('Metric by value: {0:5.4f}'.format(result['metric']), file=sys.stderr)
+    print('Metric by rank: {0}'.format(result['metric_rank'] / 2), file=sys.stderr)
+    print('Kendall distance: {0}, tau-b: {1:.4f}'.format(result['kendall_distance'], result['kendall_tau_b']),
+          file=sys.stderr)
+    print('Spearman rho: {0:.4f}'.format(result['spearman_rho']), file=sys.stderr)
+
+
+def replicate(args):
+    r1_params, r2_params = (args.a1, args.b1, args.m1), (args.a2, args.b2, args.m2)
+    keep_vectors, keep_correlations = args.output.endswith('.npz'), not args.no_rank_metrics
+    # Without the RANK_METRICS, their fields are None and only metric and metric_rank are written
+    metric_columns = METRIC_COLUMNS if keep_correlations else METRIC_COLUMNS[:2]
+    summary = Summary(args.size)
+    with stage('replications'):
+        if args.stream:
+            # Only the summary is kept, the replications go to the output batch by batch
+            if args.tolerance is not None:
+                raise ValueError("--stream and --tolerance can't be combined")
+
+            def batches():
+                for batch in iter_batches(r1_params, r2_params, args.size, args.p7, args.q1, args.replications,
+                                          seed=args.seed, batch_size=args.batch_size, workers=args.workers or None,
+                                          keep_correlations=keep_correlations):
+                    summary.update(batch)
+                    yield [getattr(batch, name) for name in metric_columns]
+            write_column_batches(args.output, metric_columns, batches(), METRIC_FORMATS)
+            result = None
+        elif args.tolerance is None:
+            result = run_replications(r1_params, r2_params, args.size, args.p7, args.q1, args.replications,
+                                      seed=args.seed, batch_size=args.batch_size, workers=args.workers or None,
+                                      keep_vectors=keep_vectors or args.summary is not None,
+                                      keep_correlations=keep_correlations)
+        else:
+            adaptive = run_adaptive(r1_params, r2_params, args.size, args.p7, args.q1, args.tolerance,
+                                    args.rank_tolerance, args.confidence, max_replications=args.replications,
+                                    seed=args.seed, batch_size=args.batch_size, workers=args.workers or None,
+                                    keep_vectors=keep_vectors or args.summary is not None,
+                                    keep_correlations=keep_correlations)
+            result = adaptive.samples
+
+    if result is not None:
+        summary.update(result)
+        if not keep_vectors:
+            result = result._replace(r1_geo_mean_normed=None, r2_geo_mean_normed=None)
+        names = [name for name, field in zip(result._fields, result) if field is not None]
+        with stage('writing output'):
+            write_columns(args.output, names, [field for field in result if field is not None], METRIC_FORMATS)
+
+    if args.tolerance is not None:
+        print(f"{'Converged' if adaptive.converged else 'Stopped at the cap'} after {adaptive.metric.count} "
+              f"replications", file=sys.stderr)
+    for name in metric_columns:
+        stats, quantiles = getattr(summary, name), getattr(summary, name + '_quantiles').quantile([.05, .5, .95])
+        interval = f' +- {stats.half_width(args.confidence):.6f} ({args.confidence:.0%} CI)' if stats.count > 1 else ''
+        print(f'{name}: mean {stats.mean:.6f}{interval}, std {stats.std if stats.count > 1 else 0:.6f}, '
+              f'5/50/95%: {quantiles[0]:.6f} {quantiles[1]:.6f} {quantiles[2]:.6f}', file=sys.stderr)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary.to_dict(), f, indent=1)
+
+
+def sweep(args):
+    size = args.size if args.r is None else len(args.r)
+    check_parameters(size, 0, 0)
+    source = (args.a1, args.b1, args.m1) if args.r is None else np.array(args.r)
+    r_normed = get_normed(get_ranking(source, size, args.seed))
+    p7, q1 = threshold_grid(args.p7, args.q1)
+    _, r_geo_mean_normed = geo_mean_sweep(r_normed, p7, q1)
+
+    # One row per (p7, q1) pair with R_n* of every alternative
+    if args.output.endswith('.npz'):
+        np.savez(args.output, p7=p7, q1=q1, r_normed=r_normed, r_geo_mean_normed=r_geo_mean_normed)
+    else:
+        write_columns(args.output, ['p7', 'q1'] + [f'R_n*{i}' for i in range(size)],
+                      [p7, q1] + list(r_geo_mean_normed.T), ['{0:.2f}'] * 2 + ['{0:5.4f}'] * size)
+
+
+def triangles(args):
+    # Every R1 triangle of the grid against every R2 one
+    r1_grid = triangle_grid(args.a1, args.b1, args.m1)
+    r2_grid = triangle_grid(args.a2, args.b2, args.m2)
+    if not len(r1_grid) or not len(r2_grid):
+        raise ValueError("The grid has no valid triangle, with a <= m <= b")
+    r1_params = np.repeat(r1_grid, len(r2_grid), axis=0)
+    r2_params = np.tile(r2_grid, (len(r1_grid), 1))
+
+    result = sweep_triangles(r1_params, r2_params, args.size, args.p7, args.q1, args.replications, args.seed,
+                             keep_correlations=not args.no_rank_metrics)
+    metric_columns = METRIC_COLUMNS[:2] if args.no_rank_metrics else METRIC_COLUMNS
+    names = ['a1', 'b1', 'm1', 'a2', 'b2', 'm2']
+    columns = list(r1_params.T) + list(r2_params.T)
+    for name in metric_columns:
+        values = getattr(result, name)
+        names += [name, name + '_std']
+        columns += [values.mean(axis=1), values.std(axis=1, ddof=1) if args.replications > 1 else 0 * values[:, 0]]
+    write_columns(args.output, names, columns, ['{0:g}'] * 6 + ['{0:.6f}'] * 2 * len(metric_columns))
+
+
+def pairs(args):
+    # Every pair of the input file, a chunk at a time. A .npz output holds (pairs, n) arrays, a .csv one row per
+    # (pair, alternative), streamed, so that a memory-mapped input never has to fit in memory.
+    ranking_pairs = load_pairs(args.input)
+    chunks = iter_pair_results(ranking_pairs, args.p7, args.q1, args.chunk_size)
+    with stage('pairs'):
+        if args.output.endswith('.npz'):
+            results = [result for _, result in chunks]
+            names = TABLE_COLUMNS + METRIC_COLUMNS
+            np.savez(args.output, **{name: np.concatenate([result[name] for result in results]) for name in names})
+        else:
+            names = ['pair', 'alternative'] + TABLE_COLUMNS + METRIC_COLUMNS
+            write_column_batches(args.output, names, (long_columns(start, result) for start, result in chunks),
+                                 ['{0}', '{0}'] + TABLE_FORMATS + METRIC_FORMATS)
+    print(f'{len(ranking_pairs)} pairs of {ranking_pairs.shape[-1]} alternatives', file=sys.stderr)
+
+
+def compare(args):
+    rankings = load_rankings(args.input)
+    result = compare_rankings(rankings, args.p7, args.q1)
+    with stage('writing output'):
+        if args.output.endswith('.npz'):
+            np.savez(args.output, **result)
+        else:
+            # One row per ordered pair of rankings
+            k = len(rankings)
+            write_columns(args.output, ['i', 'j', 'metric', 'metric_rank'],
+                          [np.repeat(np.arange(k), k), np.tile(np.arange(k), k), result['metric'].ravel(),
+                           result['metric_rank'].ravel()], ['{0}', '{0}', '{0:.6f}', '{0}'])
+    print(f'{len(rankings)} rankings of {rankings.shape[1]} alternatives', file=sys.stderr)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='rankings', description="Generate and compare rankings without the GUI")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_generate = commands.add_parser('generate', help="one run, like the Generate button")
+    add_inputs(parser_generate)
+    parser_generate.add_argument('--r1', type=get_float, nargs='+', help="manual R1 values instead of a triangle")
+    parser_generate.add_argument('--r2', type=get_float, nargs='+', help="manual R2 values instead of a triangle")
+    parser_generate.set_defaults(function=generate)
+
+    parser_replicate = commands.add_parser('replicate', help="metric and metric_rank over many random runs")
+    add_inputs(parser_replicate)
+    parser_replicate.add_argument('-n', '--replications', type=int, default=1000, help="default: 1000")
+    parser_replicate.add_argument('--workers', type=int, default=1, help="processes to use, 0 for all cores")
+    parser_replicate.add_argument('--batch-size', type=int, help="replications evaluated at once")
+    parser_replicate.add_argument('--tolerance', type=get_float,
+                                  help="stop once the confidence interval of the mean metric is within +-TOLERANCE, "
+                                       "-n being then the maximum number of replications")
+    parser_replicate.add_argument('--rank-tolerance', type=get_float, help="same for metric_rank, with --tolerance")
+    parser_replicate.add_argument('--confidence', type=get_float, default=0.95, help="of the interval (default: 0.95)")
+    parser_replicate.add_argument('--stream', action='store_true',
+                                  help="write the replications as they are produced and keep only their summary, "
+                                       "in constant memory")
+    parser_replicate.add_argument('--summary', metavar='FILE',
+                                  help="write the summary (quantiles, histograms, mean R*_n*) to FILE as JSON")
+    add_rank_metrics_option(parser_replicate)
+    parser_replicate.set_defaults(function=replicate)
+
+    parser_sweep = commands.add_parser('sweep', help="R1_n* over a grid of (p7, q1) values")
+    add_inputs(parser_sweep, sides=(1,), grid=True)
+    parser_sweep.add_argument('--r', type=get_float, nargs='+', help="manual ranking values instead of the R1 triangle")
+    parser_sweep.set_defaults(function=sweep)
+
+    parser_triangles = commands.add_parser('triangles', help="metric over a grid of (a, b, m) with common random "
+                                                             "numbers")
+    add_inputs(parser_triangles, triangles=True)
+    parser_triangles.add_argument('-n', '--replications', type=int, default=100, help="per point (default: 100)")
+    add_rank_metrics_option(parser_triangles)
+    parser_triangles.set_defaults(function=triangles)
+
+    parser_pairs = commands.add_parser('pairs', help="every (R1, R2) pair of a file")
+    add_file_inputs(parser_pairs, "a (pairs, 2, n) .npy array (memory-mapped), a .npz with it as 'pairs' or with "
+                                  "(pairs, n) arrays 'r1' and 'r2', or a .csv with one pair per line, R1 values then "
+                                  "R2 values")
+    parser_pairs.add_argument('--chunk-size', type=int, help="pairs evaluated at once")
+    parser_pairs.set_defaults(function=pairs)
+
+    parser_compare = commands.add_parser('compare', help="every ranking of a file against every other")
+    add_file_inputs(parser_compare, "a (k, n) .npy array (memory-mapped), a .npz with it as 'rankings', or a .csv "
+                                    "with one ranking per line")
+    parser_compare.set_defaults(function=compare)
+    return parser
+
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    timings = Timings(new_profile(args.profile))
+    try:
+        if args.timing_log or args.profile:
+            with recording(timings):
+                args.function(args)
+        else:
+            args.function(args)
+    except ValueError as e:
+        parser.exit(1, f'{parser.prog}: error: {e}\n')
+
+    if args.timing_log or args.profile:
+        print(f'Timings: {timings.summary()}', file=sys.stderr)
+    if args.timing_log:
+        timings.write_log(args.timing_log, job=args.command)
+    if args.profile:
+        timings.dump_profile(args.profile)
+    return 0
@@ -0,0 +1,224 @@
+import numpy as np
+from rankings.helpers import get_normed, searchsorted_rows, tie_bounds
+from rankings.timing import timed
+from rankings.cache import array_key
+
+LOG_3, LOG_7 = np.log(3), np.log(7)
+# The K matrix is stored as int8 codes -2..2, ADVANTAGES[code + 2] being the entry they stand for
+ADVANTAGES = np.array([1 / 7, 1 / 3, 1, 3, 7])
+
+
+def get_diff_matrix(r):
+    return np.subtract.outer(r, r)
+
+
+def get_percent(x, m):
+    if m == 0:
+        return np.zeros_like(x)
+    return x / m
+
+
+def advantages_matrix_positive(x, max_th, min_th):
+    # 2 (a 7) above max_th, 1 (a 3) from min_th up to it and 0 otherwise, as int8
+    above = (x > max_th).view(np.int8)
+    return above + (x >= min_th).view(np.int8) if min_th <= max_th else above * 2
+
+
+def advantages_matrix_element(x, p7, q1):
+    max_th = 1 - p7
+    return advantages_matrix_positive(x, max_th, q1) - advantages_matrix_positive(-x, max_th, q1)
+
+
+@timed
+def advantages_matrix(r, p7, q1, block_rows=256):
+    # Builds the K-matrix codes a block of rows at a time, so that no n x n float matrix is needed, and takes
+    # the row-wise geometric mean from the number of entries of each level
+    r = np.asarray(r, dtype=np.float64)
+    n = len(r)
+    dr = r.max() - r.min()
+    codes = np.empty((n, n), dtype=np.int8)
+    log_sum = np.empty(n)
+
+    for start in range(0, n, block_rows):
+        rows = slice(start, start + block_rows)
+        block = advantages_matrix_element(get_percent(np.subtract.outer(r[rows], r), dr), p7, q1)
+        codes[rows] = block
+        counts = [np.count_nonzero(block == code, axis=1) for code in (2, 1, -1, -2)]
+        log_sum[rows] = LOG_7 * (counts[0] - counts[3]) + LOG_3 * (counts[1] - counts[2])
+    return codes, np.exp(log_sum / n)
+
+
+@timed
+def difference_search_processing(r, p7, q1):
+    r = np.asarray(r, dtype=np.float64)
+    r_diff_matrix = get_diff_matrix(r)
+    r_diff_percents = get_percent(r_diff_matrix, r_diff_matrix.max())
+    r_advantages_matrix, r_geo_mean = advantages_matrix(r, p7, q1)
+    r_geo_mean_normed = get_normed(r_geo_mean)
+    return r_diff_matrix, r_diff_percents, r_advantages_matrix, r_geo_mean, r_geo_mean_normed
+
+
+def take_rows(a, indices):
+    # np.take_along_axis, where a 1-D a is shared by all rows of indices
+    return a[indices] if a.ndim == 1 else np.take_along_axis(a, indices, axis=-1)
+
+
+def exact_count(r_sorted, bounds, count, predicate):
+    # Moves searchsorted estimates onto the exact boundary of a predicate that holds on a prefix of each sorted
+    # row, so that ties at the thresholds are classified with the same float operations as the full matrix.
+    # Equal values share the predicate, hence every step jumps over a whole group of ties. A 1-D r_sorted
+    # (and bounds) is shared by all rows of count.
+    n = r_sorted.shape[-1]
+    first, last = bounds
+    while True:
+        up = count < n
+        at = np.minimum(count, n - 1)
+        up &= predicate(r_sorted, take_rows(r_sorted, at))
+        down = count > 0
+        before = np.maximum(count - 1, 0)
+        down &= ~predicate(r_sorted, take_rows(r_sorted, before))
+        if not (up.any() or down.any()):
+            return count
+        count = np.where(up, take_rows(last, at) + 1, count)
+        count = np.where(down, take_rows(first, before), count)
+
+
+def count_prefix(r_sorted, bounds, offset, side, predicate):
+    # Number of entries of each row of r_sorted for which predicate holds, which is a prefix of the row
+    return exact_count(r_sorted, bounds, searchsorted_rows(r_sorted, r_sorted + offset, side), predicate)
+
+
+def seven_counts(r_sorted, bounds, dr, max_th):
+    # Number of 7 and of 1/7 entries in the K-matrix row of each element of r_sorted, sorted rankings along
+    # the last axis. dr and max_th may be arrays broadcasting against the rows.
+    n = r_sorted.shape[-1]
+    scale = np.where(dr == 0, 1, dr)
+
+    def pos_7(ri, rj):
+        return (ri - rj) / scale > max_th
+
+    def not_neg_7(ri, rj):
+        return -((ri - rj) / scale) <= max_th
+
+    return (count_prefix(r_sorted, bounds, -max_th * dr, 'left', pos_7),
+            n - count_prefix(r_sorted, bounds, max_th * dr, 'right', not_neg_7))
+
+
+def three_counts(r_sorted, bounds, dr, max_th, q1):
+    # Number of entries >= 3 and <= 1/3 in each row, as for seven_counts
+    n = r_sorted.shape[-1]
+    scale = np.where(dr == 0, 1, dr)
+    min_th = np.minimum(q1, max_th)
+
+    def pos_3(ri, rj):
+        x = (ri - rj) / scale
+        return (x > 0) & ((x >= q1) | (x > max_th))
+
+    def not_neg_3(ri, rj):
+        x = (ri - rj) / scale
+        return (x >= 0) | ((-x < q1) & (-x <= max_th))
+
+    return (count_prefix(r_sorted, bounds, -min_th * dr, 'right', pos_3),
+            n - count_prefix(r_sorted, bounds, min_th * dr, 'left', not_neg_3))
+
+
+def level_sums(r, p7, q1):
+    # Net number of 7 (7 minus 1/7) and of 3 (3 minus 1/3) entries in the K-matrix row of each element of a
+    # 1-D ranking, as integers, so that the mean log entry of a row is (LOG_7 * sevens + LOG_3 * threes) / n
+    r = np.asarray(r, dtype=np.float64)
+    order = np.argsort(r, kind='stable')
+    r_sorted = r[order]
+    dr = r_sorted[-1:] - r_sorted[:1]
+    bounds = tie_bounds(r_sorted)
+    n7_pos, n7_neg = seven_counts(r_sorted, bounds, dr, 1 - p7)
+    n3_pos, n3_neg = three_counts(r_sorted, bounds, dr, 1 - p7, q1)
+    sevens = np.empty(len(r), dtype=np.int64)
+    threes = np.empty(len(r), dtype=np.int64)
+    sevens[order] = n7_pos - n7_neg
+    threes[order] = n3_pos - n7_pos - n3_neg + n7_neg
+    return sevens, threes
+
+
+def log_means(n, n7_pos, n7_neg, n3_pos, n3_neg):
+    # Mean log K-matrix entry of a row from the number of entries of each level
+    return (LOG_7 * (n7_pos - n7_neg) + LOG_3 * (n3_pos - n7_pos - n3_neg + n7_neg)) / n
+
+
+@timed
+def geo_mean_vector(r, p7, q1):
+    # Every K-matrix entry is one of 1/7, 1/3, 1, 3, 7, so the row-wise geometric mean only needs the count
+    # of each level per row. With the ranking sorted once, these counts are searchsorted lookups of the
+    # thresholds and nothing n x n is ever allocated. A 2-D array is processed as a batch of rankings.
+    r = np.asarray(r, dtype=np.float64)
+    n = r.shape[-1]
+    order = np.argsort(r, axis=-1, kind='stable')
+    r_sorted = np.take_along_axis(r, order, axis=-1)
+    dr = r_sorted[..., -1:] - r_sorted[..., :1]
+    bounds = tie_bounds(r_sorted)
+    log_mean = log_means(n, *seven_counts(r_sorted, bounds, dr, 1 - p7),
+                         *three_counts(r_sorted, bounds, dr, 1 - p7, q1))
+
+    r_geo_mean = np.empty(r.shape)
+    np.put_along_axis(r_geo_mean, order, np.where(dr == 0, 1., np.exp(log_mean)), axis=-1)
+    return r_geo_mean, get_normed(r_geo_mean)
+
+
+def threshold_grid(p7_values, q1_values):
+    # Every (p7, q1) pair of two lists of values that the main window would accept, i.e. with p7 + q1 <= 1
+    p7, q1 = (grid.ravel() for grid in np.meshgrid(np.asarray(p7_values, dtype=np.float64),
+                                                   np.asarray(q1_values, dtype=np.float64), indexing='ij'))
+    valid = p7 + q1 <= 1
+    return p7[valid], q1[valid]
+
+
+@timed
+def geo_mean_sweep(r, p7, q1, block_points=None):
+    # geo_mean_vector of a 1-D ranking for every (p7[g], q1[g]) pair, as two (grid points, n) arrays. Sorting
+    # and the tie groups are shared by all points, and the level counts are only computed once per distinct
+    # threshold: the 7 counts depend on p7 alone, the 3 counts on q1 alone, or are the 7 counts when
+    # q1 > 1 - p7. On a p7 x q1 grid that is len(p7_values) + len(q1_values) lookups instead of their product.
+    # Grid points are processed block_points at a time to bound the (block_points, n) temporaries.
+    r = np.asarray(r, dtype=np.float64)
+    p7, q1 = np.broadcast_arrays(np.asarray(p7, dtype=np.float64).ravel(), np.asarray(q1, dtype=np.float64).ravel())
+    if r.ndim != 1:
+        raise ValueError("The sweep takes a single ranking")
+    if np.any(p7 < 0) or np.any(q1 < 0):
+        raise ValueError("p7 and q1 should be >= 0")
+    if np.any(p7 + q1 > 1):
+        raise ValueError("p7 + q1 should be <= 1")
+
+    n = len(r)
+    block_points = block_points or max(1, 2 ** 20 // n)
+    order = np.argsort(r, kind='stable')
+    r_sorted = r[order]
+    dr = r_sorted[-1] - r_sorted[0]
+    bounds = tie_bounds(r_sorted)
+    max_th = 1 - p7
+
+    r_geo_mean = np.ones((len(p7), n))
+    for start in range(0, len(p7) if dr != 0 else 0, block_points):
+        points = slice(start, start + block_points)
+        max_ths, seven = np.unique(max_th[points], return_inverse=True)
+        q1s, three = np.unique(q1[points], return_inverse=True)
+        n7_pos, n7_neg = seven_counts(r_sorted, bounds, dr, max_ths[:, None])
+        # With q1 <= max_th the 3 counts do not depend on max_th, as if it were infinite
+        n3_pos, n3_neg = three_counts(r_sorted, bounds, dr, np.inf, q1s[:, None])
+
+        wide = (q1[points] > max_th[points])[:, None]
+        n7_pos, n7_neg = n7_pos[seven], n7_neg[seven]
+        n3_pos, n3_neg = np.where(wide, n7_pos, n3_pos[three]), np.where(wide, n7_neg, n3_neg[three])
+        r_geo_mean[points, order] = np.exp(log_means(n, n7_pos, n7_neg, n3_pos, n3_neg))
+    return r_geo_mean, get_normed(r_geo_mean)
+
+
+def memoized(function, r, p7, q1, cache=None):
+    # function(r, p7, q1) through an ArrayCache, when one is given
+    if cache is None:
+        return function(r, p7, q1)
+    return cache.get(array_key(r, function.__name__, p7, q1), lambda: function(r, p7, q1))
+
+
+@timed
+def difference_search(r1_n, r2_n, p7, q1, matrices=True, cache=None):
+    function = difference_search_processing if matrices else geo_mean_vector
+    return memoized(function, r1_n, p7, q1, cache), memoized(function, r2_n, p7, q1, cache)
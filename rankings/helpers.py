@@ -0,0 +1,54 @@
+import numpy as np
+from rankings.timing import timed
+
+
+def get_float(string):
+    if not string:
+        raise ValueError('Empty value!')
+    return float(string.replace(',', '.'))
+
+
+@timed
+def get_normed(r1):
+    if np.ndim(r1) > 1:
+        sums = r1.sum(axis=-1, keepdims=True)
+        return np.divide(r1, sums, out=np.full(r1.shape, 1 / r1.shape[-1]), where=sums != 0)
+    total = r1.sum()
+    return r1 / total if total else np.full(r1.shape, 1 / len(r1))
+
+
+def tie_bounds(r_sorted):
+    # First and last position of the group of equal values each position of a sorted row belongs to
+    n = r_sorted.shape[-1]
+    positions = np.broadcast_to(np.arange(n), r_sorted.shape)
+    is_first = np.ones(r_sorted.shape, dtype=bool)
+    is_first[..., 1:] = r_sorted[..., 1:] != r_sorted[..., :-1]
+    is_last = np.ones(r_sorted.shape, dtype=bool)
+    is_last[..., :-1] = is_first[..., 1:]
+    first = np.maximum.accumulate(np.where(is_first, positions, 0), axis=-1)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(is_last, positions, n - 1), axis=-1), axis=-1), axis=-1)
+    return first, last
+
+
+def searchsorted_rows(a, v, side='left'):
+    # np.searchsorted applied to every row of a sorted 2-D array, done as one stable merge of a and v
+    if a.ndim == 1:
+        return np.searchsorted(a, v, side)
+
+    n, m = a.shape[-1], v.shape[-1]
+    if side == 'left':
+        merged, is_query = np.concatenate([v, a], axis=-1), np.arange(n + m) < m
+        query_offset = 0
+    else:
+        merged, is_query = np.concatenate([a, v], axis=-1), np.arange(n + m) >= n
+        query_offset = n
+
+    order = np.argsort(merged, axis=-1, kind='stable')
+    queries = is_query[order]
+    preceding = np.cumsum(~queries, axis=-1)
+
+    count = np.empty(v.shape, dtype=np.intp)
+    np.put_along_axis(count, (order[queries] - query_offset).reshape(v.shape),
+                      preceding[queries].reshape(v.shape), axis=-1)
+    return count
+
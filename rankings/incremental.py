@@ -0,0 +1,125 @@
+import numpy as np
+from rankings.triangle import rankify_improved
+from rankings.helpers import get_normed
+from rankings.difference_search import (advantages_matrix, advantages_matrix_element, get_percent, level_sums,
+                                        geo_mean_vector, LOG_3, LOG_7)
+from rankings.rank_correlation import rank_metrics
+from rankings.timing import timed
+
+
+# Contribution of a K-matrix code, SEVENS[code + 2] and THREES[code + 2], to the level_sums of its row
+SEVENS = np.array([-1, 0, 0, 0, 1])
+THREES = np.array([0, -1, 0, 1, 0])
+
+
+class IncrementalRankings:
+    # The results of run_pipeline for two rankings, kept up to date as their values change one at a time, e.g.
+    # while a slider is dragged. Changing one value
+    #   - changes the sum of its ranking, in O(1), and with it every normed value, D_n and metric, in O(n),
+    #   - moves it in the sorted copy of its ranking, one O(n) shift, which only changes the ranks of the
+    #     values between the old and the new one, found with searchsorted,
+    #   - only changes the row and the column of its K-matrix entries, unless it changes the range of the
+    #     ranking, which rescales every entry. The geometric means are kept as the integer number of 7s and 3s
+    #     of each row (level_sums), to which the column contributes one entry per row, so that no n x n matrix
+    #     is needed and no rounding error accumulates.
+    # The K-matrix entries only depend on the differences of the values relative to their range, which
+    # normalizing leaves unchanged, so they are computed on the raw values. Where a difference falls exactly
+    # on a threshold, rounding can then classify it unlike run_pipeline, which works on the normed values, so
+    # geo_mean and the codes kept with matrices (for the matrix windows) may differ from Generate there.
+    # table() computes R*_n* again from the normed values, in O(n log n), to match run_pipeline.
+    def __init__(self, r1, r2, p7, q1, matrices=False):
+        self.values = [np.array(r, dtype=np.float64) for r in (r1, r2)]
+        if self.values[0].shape != self.values[1].shape or self.values[0].ndim != 1:
+            raise ValueError("R1 and R2 should have the same number of values")
+        self.size = len(self.values[0])
+        self.p7, self.q1 = p7, q1
+        self.sums = [r.sum() for r in self.values]
+        self.sorted = [np.sort(r) for r in self.values]
+        self.ranks = [rankify_improved(r) - 1 for r in self.values]
+        self.diff_ranks = np.absolute(self.ranks[0] - self.ranks[1])
+        self.metric_rank = self.diff_ranks.sum()
+        self.levels = [level_sums(r, p7, q1) for r in self.values]
+        self.codes = [advantages_matrix(r, p7, q1)[0] for r in self.values] if matrices else None
+
+    @timed
+    def update(self, side, i, value):
+        # Sets alternative i of ranking side (0 for R1, 1 for R2) to value
+        r, r_sorted = self.values[side], self.sorted[side]
+        old = r[i]
+        if value == old:
+            return self
+        old_range = r_sorted[-1] - r_sorted[0]
+
+        # Old K-matrix column, K[j, i] for every j, while r[i] is still the old value
+        column = advantages_matrix_element(get_percent(r - old, old_range), self.p7, self.q1)
+
+        position, target = np.searchsorted(r_sorted, [old, value])
+        if target > position:
+            r_sorted[position:target - 1] = r_sorted[position + 1:target]
+            r_sorted[target - 1] = value
+        else:
+            r_sorted[target + 1:position + 1] = r_sorted[target:position]
+            r_sorted[target] = value
+        r[i] = value
+        self.sums[side] += value - old
+
+        # Tie-averaged ranks, from 0, of the values between the old and the new one, both included. Those strictly
+        # between have one value less or one more below them, those equal to either are looked up again.
+        moved = np.flatnonzero((r >= min(old, value)) & (r <= max(old, value)))
+        ranks = self.ranks[side][moved] + np.sign(old - value)
+        tied = (r[moved] == old) | (r[moved] == value)
+        ranks[tied] = (np.searchsorted(r_sorted, r[moved][tied], 'left')
+                       + np.searchsorted(r_sorted, r[moved][tied], 'right') - 1) / 2
+        self.ranks[side][moved] = ranks
+        diff_ranks = np.absolute(self.ranks[0][moved] - self.ranks[1][moved])
+        self.metric_rank += diff_ranks.sum() - self.diff_ranks[moved].sum()
+        self.diff_ranks[moved] = diff_ranks
+
+        new_range = r_sorted[-1] - r_sorted[0]
+        if new_range != old_range:
+            self.levels[side] = level_sums(r, self.p7, self.q1)
+            if self.codes is not None:
+                self.codes[side] = advantages_matrix(r, self.p7, self.q1)[0]
+            return self
+
+        new_column = advantages_matrix_element(get_percent(r - value, new_range), self.p7, self.q1)
+        sevens, threes = self.levels[side]
+        sevens += SEVENS[new_column + 2] - SEVENS[column + 2]
+        threes += THREES[new_column + 2] - THREES[column + 2]
+        # Row i is minus the column, K being antisymmetric in log
+        sevens[i] = -SEVENS[new_column + 2].sum()
+        threes[i] = -THREES[new_column + 2].sum()
+        if self.codes is not None:
+            self.codes[side][:, i] = new_column
+            self.codes[side][i] = -new_column
+        return self
+
+    def normed(self, side):
+        r = self.values[side]
+        return r / self.sums[side] if self.sums[side] else np.full(self.size, 1 / self.size)
+
+    def geo_mean(self, side):
+        sevens, threes = self.levels[side]
+        return np.exp((LOG_7 * sevens + LOG_3 * threes) / self.size)
+
+    @property
+    def diff(self):
+        return np.absolute(self.normed(0) - self.normed(1))
+
+    @property
+    def metric(self):
+        return self.diff.sum()
+
+    def table(self):
+        # As in run_pipeline, with the columns of TABLE_COLUMNS. The normed values are computed again as
+        # run_pipeline does, as the running sums can differ from it in the last bits.
+        r1_normed, r2_normed = get_normed(self.values[0]), get_normed(self.values[1])
+        (_, r1_geo_mean_normed), (_, r2_geo_mean_normed) = (geo_mean_vector(r, self.p7, self.q1)
+                                                             for r in (r1_normed, r2_normed))
+        return np.column_stack([self.values[0], self.values[1], r1_normed, r1_geo_mean_normed, r2_normed,
+                                r2_geo_mean_normed, np.absolute(r1_normed - r2_normed), self.ranks[0],
+                                self.ranks[1], self.diff_ranks])
+
+    def metrics(self):
+        # metric, metric_rank and the RANK_METRICS, the latter computed again in O(n log n)
+        return {'metric': self.metric, 'metric_rank': self.metric_rank, **rank_metrics(*self.ranks)}
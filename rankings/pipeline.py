@@ -0,0 +1,49 @@
+import numpy as np
+from rankings.triangle import triangular, get_diff_ranks
+from rankings.helpers import get_normed
+from rankings.difference_search import difference_search
+from rankings.rank_correlation import rank_metrics
+from rankings.timing import stage
+
+TABLE_COLUMNS = ['R1', 'R2', 'R1_n', 'R1_n*', 'R2_n', 'R2_n*', 'D_n', 'R1_r', 'R2_r', 'D_r']
+TABLE_FORMATS = ['{0:5.2f}', '{0:5.2f}', '{0:5.4f}', '{0:5.4f}', '{0:5.4f}', '{0:5.4f}', '{0:5.4f}',
+                 '{0}', '{0}', '{0}']
+PIPELINE_STEPS = 4
+
+
+def get_ranking(source, size, seed=None):
+    # A manual ranking is given as its values, an automatic one as the (a, b, m) triangle to sample from
+    return triangular(*source, size, seed=seed) if isinstance(source, tuple) else np.asarray(source)
+
+
+def run_pipeline(size, p7, q1, r1_source, r2_source, seed=None, report=None, cache=None):
+    # Single generate run: returns the main table (columns as in TABLE_COLUMNS), both metrics, the
+    # RANK_METRICS and the normed rankings. report(step, stage) is called before each of the PIPELINE_STEPS
+    # stages. The geometric means of each side are looked up in cache, an ArrayCache, if given.
+    report = report or (lambda step, stage: None)
+    rng = np.random.default_rng(seed)
+
+    report(0, "Sampling rankings")
+    with stage('sampling'):
+        r1 = get_ranking(r1_source, size, rng)
+        r2 = get_ranking(r2_source, size, rng)
+
+    report(1, "Normalizing")
+    with stage('normalizing'):
+        r1_normed = get_normed(r1)
+        r2_normed = get_normed(r2)
+
+    report(2, "Ranking")
+    with stage('ranking'):
+        diff, r1_ranks, r2_ranks, diff_ranks = get_diff_ranks(r1_normed, r2_normed)
+        correlations = rank_metrics(r1_ranks, r2_ranks)
+
+    report(3, "Computing geometric means")
+    with stage('geometric means'):
+        (_, r1_geo_mean_normed), (_, r2_geo_mean_normed) = difference_search(r1_normed, r2_normed, p7, q1,
+                                                                             matrices=False, cache=cache)
+
+    table = np.column_stack([r1, r2, r1_normed, r1_geo_mean_normed, r2_normed, r2_geo_mean_normed,
+                             diff, r1_ranks, r2_ranks, diff_ranks])
+    return {'table': table, 'metric': diff.sum(), 'metric_rank': diff_ranks.sum(), **correlations,
+            'normed': (r1_normed, r2_normed)}
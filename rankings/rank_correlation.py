@@ -0,0 +1,93 @@
+import numpy as np
+from rankings.helpers import tie_bounds
+from rankings.timing import timed
+
+# Rank correlations between two rankings given by the tie-averaged ranks of rankify_improved (or get_diff_ranks).
+# Like them, they take 1-D ranks or 2-D arrays of ranks, one ranking per row, and return one value per row.
+RANK_METRICS = ['kendall_distance', 'kendall_tau_b', 'spearman_rho']
+
+
+def rank_codes(ranks):
+    # Tie-averaged ranks are multiples of 0.5, so twice them are exact integers in [0, 2n]
+    return np.rint(2 * np.asarray(ranks, dtype=np.float64)).astype(np.int64)
+
+
+def tied_pairs(a_sorted):
+    # Pairs of equal values along the last axis of a sorted array: each value is tied with those before it in
+    # its run of equal values
+    first, _ = tie_bounds(a_sorted)
+    return (np.arange(a_sorted.shape[-1]) - first).sum(axis=-1)
+
+
+def count_inversions(codes):
+    # Pairs i < j with codes[i] > codes[j] along the last axis of non-negative integer codes, by a bottom-up
+    # merge sort run on all rows and blocks at once: at each level, the sorted halves of every block are
+    # merged by one stable argsort of (row, block, code) keys, which timsort does in linear time as the halves
+    # are sorted runs. The left elements placed before a right one are those not greater than it.
+    codes = np.asarray(codes, dtype=np.int64)
+    n = codes.shape[-1]
+    values = codes.reshape(-1, n)
+    rows = len(values)
+    base = values.max(initial=0) + 1
+    positions = np.arange(n)
+    row_starts = np.arange(rows)[:, None] * n
+
+    inversions = np.zeros(rows, dtype=np.int64)
+    width = 1
+    while width < n:
+        block = positions // (2 * width)
+        keys = (np.arange(rows)[:, None] * (n // (2 * width) + 1) + block) * base + values
+        order = np.argsort(keys, axis=None, kind='stable')
+        new_positions = np.empty(rows * n, dtype=np.int64)
+        new_positions[order] = np.arange(rows * n)
+
+        in_block = positions - block * 2 * width
+        right = in_block >= width
+        merged_in_block = new_positions.reshape(rows, n)[:, right] - row_starts - (block * 2 * width)[right]
+        not_greater = merged_in_block - (in_block[right] - width)
+        inversions += (width - not_greater).sum(axis=-1)
+
+        values = values.ravel()[order].reshape(rows, n)
+        width *= 2
+    return inversions.reshape(codes.shape[:-1])[()]
+
+
+@timed
+def kendall(r1_ranks, r2_ranks):
+    # Kendall tau distance, the number of discordant pairs, and Kendall tau-b, which corrects tau for the ties
+    # of either ranking (Knight's algorithm): sorted by R1 then R2, the discordant pairs are the inversions of
+    # R2. tau-b is nan when a ranking is all ties.
+    x, y = rank_codes(r1_ranks), rank_codes(r2_ranks)
+    n = x.shape[-1]
+    order = np.lexsort((y, x), axis=-1)
+    x_sorted = np.take_along_axis(x, order, axis=-1)
+    y_by_x = np.take_along_axis(y, order, axis=-1)
+
+    discordant = count_inversions(y_by_x)
+    pairs = n * (n - 1) // 2
+    x_ties = tied_pairs(x_sorted)
+    y_ties = tied_pairs(np.sort(y, axis=-1))
+    # Pairs tied in both, runs of equal (x, y) in the lexicographic order
+    joint_ties = tied_pairs(x_sorted * (y.max(initial=0) + 1) + y_by_x)
+
+    concordant_minus_discordant = pairs - x_ties - y_ties + joint_ties - 2 * discordant
+    untied = np.multiply(pairs - x_ties, pairs - y_ties, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau_b = concordant_minus_discordant / np.sqrt(untied)
+    return discordant, tau_b
+
+
+@timed
+def spearman_rho(r1_ranks, r2_ranks):
+    # Pearson correlation of the tie-averaged ranks, 1 - 6 sum(d^2) / (n (n^2 - 1)) without ties. nan when a
+    # ranking is all ties.
+    dx = r1_ranks - np.mean(r1_ranks, axis=-1, keepdims=True)
+    dy = r2_ranks - np.mean(r2_ranks, axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (dx * dy).sum(axis=-1) / np.sqrt((dx * dx).sum(axis=-1) * (dy * dy).sum(axis=-1))
+
+
+def rank_metrics(r1_ranks, r2_ranks):
+    # The RANK_METRICS of two rankings, as a dict
+    kendall_distance, kendall_tau_b = kendall(r1_ranks, r2_ranks)
+    return dict(zip(RANK_METRICS, (kendall_distance, kendall_tau_b, spearman_rho(r1_ranks, r2_ranks))))
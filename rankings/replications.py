@@ -0,0 +1,226 @@
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import os
+import numpy as np
+from rankings.triangle import triangular, triangular_ppf, check_triangle, get_diff_ranks
+from rankings.helpers import get_normed
+from rankings.difference_search import difference_search
+from rankings.rank_correlation import rank_metrics, RANK_METRICS
+from rankings.stats import RunningStats, QuantileDigest, Histogram, z_score
+
+# metric is the sum of D_n and metric_rank the sum of D_r per replication (the GUI shows metric_rank / 2), followed by
+# the RANK_METRICS of each replication
+METRICS = ['metric', 'metric_rank'] + RANK_METRICS
+Replications = namedtuple('Replications', METRICS + ['r1_geo_mean_normed', 'r2_geo_mean_normed'])
+# samples are the Replications actually run, metric and metric_rank their RunningStats
+Adaptive = namedtuple('Adaptive', ['samples', 'metric', 'metric_rank', 'converged'])
+
+
+def check_parameters(size, p7, q1):
+    if size < 2:
+        raise ValueError("Size should be > 1")
+    if p7 + q1 > 1:
+        raise ValueError("p7 + q1 should be <= 1")
+
+
+def evaluate(r1, r2, p7, q1, vectors=True, correlations=True):
+    # Metrics of every row of two (replications, size) arrays of sampled rankings. The geometric means are
+    # only needed for the R*_n* vectors, so they are skipped without them. Without correlations, the
+    # RANK_METRICS are skipped too (None), as Kendall's merge sort costs more than the other metrics together.
+    r1_normed = get_normed(r1)
+    r2_normed = get_normed(r2)
+
+    diff, r1_ranks, r2_ranks, diff_ranks = get_diff_ranks(r1_normed, r2_normed)
+    metrics = dict(metric=diff.sum(axis=-1), metric_rank=diff_ranks.sum(axis=-1))
+    metrics.update(rank_metrics(r1_ranks, r2_ranks) if correlations else dict.fromkeys(RANK_METRICS))
+    if not vectors:
+        return Replications(**metrics, r1_geo_mean_normed=None, r2_geo_mean_normed=None)
+    (_, r1_geo_mean_normed), (_, r2_geo_mean_normed) = difference_search(r1_normed, r2_normed, p7, q1,
+                                                                         matrices=False)
+    return Replications(**metrics, r1_geo_mean_normed=r1_geo_mean_normed, r2_geo_mean_normed=r2_geo_mean_normed)
+
+
+def replicate(r1_params, r2_params, size, p7, q1, replications, seed=None, vectors=True, correlations=True):
+    rng = np.random.default_rng(seed)
+    r1 = triangular(*r1_params, size, replications=replications, seed=rng)
+    r2 = triangular(*r2_params, size, replications=replications, seed=rng)
+    return evaluate(r1, r2, p7, q1, vectors, correlations)
+
+
+def replicate_batch(task):
+    # Runs in the worker processes, so only the per-replication scalars (and the R*_n* vectors if asked for)
+    # travel back to the parent
+    *args, keep_vectors, keep_correlations = task
+    return replicate(*args, vectors=keep_vectors, correlations=keep_correlations)
+
+
+def merge_replications(batches):
+    return Replications(*(np.concatenate(field) if field[0] is not None else None for field in zip(*batches)))
+
+
+def iter_tasks(r1_params, r2_params, size, p7, q1, replications, seed=None, batch_size=None, keep_vectors=True,
+               keep_correlations=True):
+    # Every batch draws from its own stream spawned from the master seed. The split into batches depends only
+    # on replications and batch_size, so results do not depend on how many workers run them. Batches are
+    # of at most 1000 replications by default, so that a few thousand are still split among the workers.
+    check_parameters(size, p7, q1)
+    if replications <= 0:
+        raise ValueError('replications <= 0')
+
+    batch_size = batch_size or max(1, min(1000, 2 ** 18 // size))
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    for done in range(0, replications, batch_size):
+        # Children are spawned one at a time, which gives the same streams as spawning them all at once
+        child, = seed.spawn(1)
+        yield (r1_params, r2_params, size, p7, q1, min(batch_size, replications - done), child, keep_vectors,
+               keep_correlations)
+
+
+def iter_batches(r1_params, r2_params, size, p7, q1, replications, seed=None, batch_size=None, workers=1,
+                 keep_vectors=True, keep_correlations=True):
+    # The Replications of every batch, in order, as soon as they are computed. workers > 1 (or None for all
+    # cores) runs them on a process pool, with at most two batches per worker submitted ahead, so memory stays
+    # flat whatever the number of replications. Leaving the loop early cancels the batches not started yet.
+    tasks = iter_tasks(r1_params, r2_params, size, p7, q1, replications, seed, batch_size, keep_vectors,
+                       keep_correlations)
+    if workers == 1:
+        yield from map(replicate_batch, tasks)
+        return
+
+    executor = ProcessPoolExecutor(workers)
+    try:
+        pending = deque(executor.submit(replicate_batch, task)
+                        for task in islice(tasks, 2 * (workers or os.cpu_count() or 1)))
+        while pending:
+            batch = pending.popleft().result()
+            pending.extend(executor.submit(replicate_batch, task) for task in islice(tasks, 1))
+            yield batch
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_replications(r1_params, r2_params, size, p7, q1, replications, seed=None, batch_size=None, workers=1,
+                     keep_vectors=True, keep_correlations=True):
+    # r1_params and r2_params are the (a, b, m) triangles of both rankings. Replications are drawn and
+    # evaluated as (batch_size, size) arrays so memory stays bounded while computing; all of them are returned.
+    # See iter_batches and Summary to aggregate long runs instead. keep_vectors and keep_correlations=False skip
+    # the R*_n* vectors and the RANK_METRICS, left None, for runs that only need metric and metric_rank.
+    return merge_replications(list(iter_batches(r1_params, r2_params, size, p7, q1, replications, seed,
+                                                batch_size, workers, keep_vectors, keep_correlations)))
+
+
+def run_adaptive(r1_params, r2_params, size, p7, q1, tolerance, rank_tolerance=None, confidence=0.95,
+                 max_replications=100000, min_replications=100, seed=None, batch_size=None, workers=1,
+                 keep_vectors=False, keep_correlations=True):
+    # run_replications that stops once the confidence interval of the mean metric (and of the mean
+    # metric_rank, with rank_tolerance) is narrower than +-tolerance, or after max_replications. Batches are
+    # those of run_replications with max_replications, taken in order, so a run is a prefix of that one and
+    # reproducible for a seed whatever the number of workers.
+    if tolerance <= 0 or (rank_tolerance is not None and rank_tolerance <= 0):
+        raise ValueError('tolerance <= 0')
+    z_score(confidence)  # Fails early on an invalid confidence
+    metric, metric_rank = RunningStats(), RunningStats()
+    batches = []
+
+    def converged():
+        return (metric.count >= max(min_replications, 2) and metric.half_width(confidence) <= tolerance and
+                (rank_tolerance is None or metric_rank.half_width(confidence) <= rank_tolerance))
+
+    for batch in iter_batches(r1_params, r2_params, size, p7, q1, max_replications, seed, batch_size, workers,
+                              keep_vectors, keep_correlations):
+        batches.append(batch)
+        metric.update(batch.metric)
+        metric_rank.update(batch.metric_rank)
+        if converged():
+            break
+    return Adaptive(merge_replications(batches), metric, metric_rank, converged())
+
+
+class Summary:
+    # Aggregate of a stream of Replications batches in constant memory: running mean and variance, quantile
+    # digest and histogram of each of the METRICS, and the mean R1_n* and R2_n* of every alternative when
+    # the batches carry them.
+    def __init__(self, size, bins=50, compression=200):
+        # metric sums the differences of two normed rankings, so it is at most 2, metric_rank at most n^2 / 2,
+        # the Kendall distance counts at most n (n - 1) / 2 pairs and the correlations are in [-1, 1]
+        ranges = {'metric': (0, 2), 'metric_rank': (0, size * size / 2),
+                  'kendall_distance': (0, size * (size - 1) / 2), 'kendall_tau_b': (-1, 1), 'spearman_rho': (-1, 1)}
+        for name in METRICS:
+            setattr(self, name, RunningStats())
+            setattr(self, name + '_quantiles', QuantileDigest(compression))
+            setattr(self, name + '_histogram', Histogram(np.linspace(*ranges[name], bins + 1)))
+        self.r1_geo_mean_normed, self.r2_geo_mean_normed = RunningStats(), RunningStats()
+
+    def update(self, batch):
+        for name in METRICS:
+            values = getattr(batch, name)
+            if values is None:
+                continue
+            for aggregate in (name, name + '_quantiles', name + '_histogram'):
+                getattr(self, aggregate).update(values)
+        if batch.r1_geo_mean_normed is not None:
+            self.r1_geo_mean_normed.update(batch.r1_geo_mean_normed)
+            self.r2_geo_mean_normed.update(batch.r2_geo_mean_normed)
+        return self
+
+    def to_dict(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        summary = {'replications': self.metric.count}
+        for name in METRICS:
+            stats, histogram = getattr(self, name), getattr(self, name + '_histogram')
+            if not stats.count:
+                continue
+            summary[name] = {'mean': stats.mean, 'std': float(stats.std),
+                             'quantiles': dict(zip(map(str, quantiles),
+                                                   getattr(self, name + '_quantiles').quantile(quantiles).tolist())),
+                             'histogram': {'edges': histogram.edges.tolist(), 'counts': histogram.counts.tolist(),
+                                           'below': histogram.below, 'above': histogram.above}}
+        for name in ('r1_geo_mean_normed', 'r2_geo_mean_normed'):
+            stats = getattr(self, name)
+            if stats.count:
+                summary[name] = {'mean': stats.mean.tolist(), 'std': np.atleast_1d(stats.std).tolist()}
+        return summary
+
+
+def triangle_grid(a_values, b_values, m_values):
+    # Every valid (a, b, m) triangle of three lists of values, as a (triangles, 3) array
+    grid = np.stack(np.meshgrid(np.asarray(a_values, dtype=np.float64), np.asarray(b_values, dtype=np.float64),
+                                np.asarray(m_values, dtype=np.float64), indexing='ij'), axis=-1).reshape(-1, 3)
+    a, b, m = grid.T
+    return grid[(a <= m) & (m <= b)]
+
+
+def sweep_triangles(r1_params, r2_params, size, p7, q1, replications=1, seed=None, block_points=None,
+                    keep_vectors=False, keep_correlations=True):
+    # Replications at every point of a grid of triangles with common random numbers: the uniform variates are
+    # drawn once and mapped through the inverse CDF of every triangle, so differences between points are not
+    # buried in sampling noise. r1_params and r2_params are (points, 3) arrays of (a, b, m), or one triangle
+    # for a side that stays fixed. Returns Replications of (points, replications) arrays, or
+    # (points, replications, size) for the vectors. With the same seed, every point with a < b draws exactly
+    # what replicate would draw.
+    check_parameters(size, p7, q1)
+    if replications <= 0:
+        raise ValueError('replications <= 0')
+    r1_params, r2_params = np.broadcast_arrays(np.atleast_2d(np.asarray(r1_params, dtype=np.float64)),
+                                               np.atleast_2d(np.asarray(r2_params, dtype=np.float64)))
+    check_triangle(*r1_params.T)
+    check_triangle(*r2_params.T)
+
+    rng = np.random.default_rng(seed)
+    u1 = rng.random((replications, size))
+    u2 = rng.random((replications, size))
+
+    points = len(r1_params)
+    block_points = block_points or max(1, 2 ** 18 // (replications * size))
+    blocks = []
+    for start in range(0, points, block_points):
+        # (a, b, m) of the block, each as a (block, 1, 1) array against the (replications, size) variates
+        r1_block, r2_block = (params[start:start + block_points].T[..., None, None]
+                              for params in (r1_params, r2_params))
+        r1 = triangular_ppf(u1, *r1_block).reshape(-1, size)
+        r2 = triangular_ppf(u2, *r2_block).reshape(-1, size)
+        result = evaluate(r1, r2, p7, q1, keep_vectors, keep_correlations)
+        shape = (r1_block.shape[1], replications)
+        blocks.append(Replications(*(None if field is None else field.reshape(shape + field.shape[1:])
+                                     for field in result)))
+    return merge_replications(blocks)
@@ -0,0 +1,134 @@
+import math
+from statistics import NormalDist
+import numpy as np
+
+
+def z_score(confidence):
+    # Two-sided normal quantile, e.g. 1.96 for 0.95
+    if not 0 < confidence < 1:
+        raise ValueError("confidence should be between 0 and 1")
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+class RunningStats:
+    # Mean and variance of a stream of values fed a batch at a time: the mean and sum of squared deviations of
+    # each batch are computed with numpy and merged into the running ones (Chan et al., the batch form of
+    # Welford's update), which stays accurate where the sum of squares would cancel. Batches of vectors, as
+    # (samples, k) arrays, give the statistics of each of the k columns.
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values.reshape(-1) if values.ndim < 2 else values
+        n = len(values)
+        if n == 0:
+            return self
+        mean = values.mean(axis=0)
+        m2 = np.square(values - mean).sum(axis=0)
+        delta = mean - self.mean
+        count = self.count + n
+        self.mean = self.mean + delta * n / count
+        self.m2 = self.m2 + m2 + delta * delta * self.count * n / count
+        self.count = count
+        return self
+
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count:
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * other.count / count
+            self.m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+            self.count = count
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def half_width(self, confidence=0.95):
+        # Of the normal confidence interval of the mean
+        return z_score(confidence) * np.sqrt(self.variance / self.count) if self.count > 1 else math.inf
+
+
+class QuantileDigest:
+    # Quantiles of a stream in constant memory, as a merging t-digest: the values are kept as at most about
+    # compression weighted centroids, small near both tails, where the quantiles need them precise, and large
+    # in the middle. A batch is sorted together with the centroids and merged back with one grouping pass,
+    # so the work per value stays in numpy.
+    def __init__(self, compression=200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return self.weights.sum()
+
+    def update(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return self
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64).ravel()
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+
+        # Consecutive items sharing the integer part of the scale function k1 at their middle merge into one
+        # centroid, which keeps every centroid within one unit of k
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.concatenate([[True], k[1:] != k[:-1]]))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+        return self
+
+    def merge(self, other):
+        if len(other.means):
+            self.update(other.means, other.weights)
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        # Linear interpolation between the centroids, placed at the middle of their weight, and the extremes
+        if not len(self.means):
+            return np.full(np.shape(q), math.nan)
+        total = self.weights.sum()
+        centers = np.concatenate([[0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        means = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q) * total, centers, means)
+
+
+class Histogram:
+    # Counts of a stream over fixed bin edges, with the values below and above the edges counted apart
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.below = 0
+        self.above = 0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.counts += np.histogram(values, self.edges)[0]
+        self.below += np.count_nonzero(values < self.edges[0])
+        self.above += np.count_nonzero(values > self.edges[-1])
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.below += other.below
+        self.above += other.above
+        return self
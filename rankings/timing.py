@@ -0,0 +1,97 @@
+import cProfile
+import functools
+import json
+import threading
+import time
+
+# Stages are only timed while a Timings recorder is active on the current thread, see recording(). Without one,
+# stage() and @timed cost a thread-local lookup.
+_local = threading.local()
+
+
+class Timings:
+    def __init__(self, profile=None):
+        # name -> [seconds, calls], nested stages are named 'outer/inner'
+        self.stages = {}
+        self.path = []
+        self.profile = profile
+
+    def add(self, name, seconds):
+        entry = self.stages.setdefault(name, [0., 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def top_level(self):
+        return {name: seconds for name, (seconds, _) in self.stages.items() if '/' not in name}
+
+    def total(self):
+        return sum(self.top_level().values())
+
+    def summary(self):
+        return ', '.join(f'{name} {seconds * 1000:.1f} ms' for name, seconds in self.top_level().items())
+
+    def write_log(self, path, **fields):
+        # One JSON object per line, so that the log can be appended to across runs
+        record = {'time': time.time(), **fields, 'total': self.total(),
+                  'stages': {name: {'seconds': seconds, 'calls': calls}
+                             for name, (seconds, calls) in self.stages.items()}}
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def dump_profile(self, path):
+        if self.profile is not None:
+            self.profile.dump_stats(path)
+
+
+class recording:
+    # Makes timings the recorder of the current thread, and runs its profiler if it has one
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'timings', None)
+        _local.timings = self.timings
+        if self.timings.profile is not None:
+            self.timings.profile.enable()
+        return self.timings
+
+    def __exit__(self, *exc_info):
+        if self.timings.profile is not None:
+            self.timings.profile.disable()
+        _local.timings = self.previous
+
+
+class stage:
+    __slots__ = ('name', 'timings', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = getattr(_local, 'timings', None)
+        if self.timings is not None:
+            self.timings.path.append(self.name)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            seconds = time.perf_counter() - self.start
+            self.timings.add('/'.join(self.timings.path), seconds)
+            self.timings.path.pop()
+
+
+def timed(function):
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if getattr(_local, 'timings', None) is None:
+            return function(*args, **kwargs)
+        with stage(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def new_profile(path):
+    return cProfile.Profile() if path else None
@@ -0,0 +1,233 @@
+import numpy as np
+from rankings.triangle import check_triangle
+from rankings.difference_search import LOG_3, LOG_7
+from rankings.pipeline import TABLE_COLUMNS
+from rankings.replications import check_parameters
+from rankings.timing import stage
+
+COMPLEX_DTYPES = {np.dtype(np.float64): np.complex128, np.dtype(np.float32): np.complex64}
+
+
+class RankingWorkspace:
+    # run_pipeline for rankings of a given size, run again and again (replication loops, live updates) into
+    # buffers allocated once, so that a run allocates no new arrays. Every step writes into its buffer with
+    # out=, and the steps numpy has no out= for are replaced:
+    #   - argsort, by an in-place sort of complex values holding the value and its position, which complex
+    #     numbers order lexicographically,
+    #   - searchsorted, by an in-place sort of the values merged with the queries, in which the position of
+    #     a query less the queries before it is the count.
+    # The results are the same as run_pipeline's, with the same seed, except for the RANK_METRICS, which are
+    # not computed (rank_metrics(workspace.r1_ranks, workspace.r2_ranks) gives them). They are views of the
+    # buffers, valid until the next run. float32 halves the memory, at the cost of float32 results.
+    def __init__(self, size, dtype=np.float64):
+        dtype = np.dtype(dtype)
+        if dtype not in COMPLEX_DTYPES:
+            raise ValueError("dtype should be float64 or float32")
+        if size < 2:
+            raise ValueError("Size should be > 1")
+        if dtype == np.float32 and size > 2 ** 24:
+            raise ValueError("float32 positions are exact up to 2 ** 24 alternatives")
+        n = self.size = size
+        self.dtype = dtype
+
+        # The table, transposed, with one row per TABLE_COLUMNS column
+        self.columns = np.empty((len(TABLE_COLUMNS), n), dtype)
+        (self.r1, self.r2, self.r1_normed, self.r1_geo_mean_normed, self.r2_normed, self.r2_geo_mean_normed,
+         self.diff, self.r1_ranks, self.r2_ranks, self.diff_ranks) = self.columns
+
+        self.positions = np.arange(n)
+        self.pairs = np.empty(n, COMPLEX_DTYPES[dtype])
+        self.merged = np.empty(2 * n, COMPLEX_DTYPES[dtype])
+        self.merged_index = np.empty(2 * n, np.intp)
+        self.merged_count = np.empty(2 * n, np.intp)
+        # One more slot, where the values merged with the queries are put
+        self.query_count = np.empty(n + 1, np.intp)
+        self.order, self.first, self.last, self.at, self.before, self.index = np.empty((6, n), np.intp)
+        self.counts = np.empty((4, n), np.intp)
+        self.r_sorted, self.queries, self.x, self.y = np.empty((4, n), dtype)
+        self.flags = np.empty((5, n), bool)
+
+    def run(self, p7, q1, r1_source, r2_source, seed=None):
+        # As run_pipeline(size, p7, q1, r1_source, r2_source, seed), seed being possibly a Generator that a
+        # loop keeps drawing from
+        check_parameters(self.size, p7, q1)
+        rng = np.random.default_rng(seed)
+
+        with stage('sampling'):
+            self.sample(r1_source, rng, self.r1)
+            self.sample(r2_source, rng, self.r2)
+
+        with stage('normalizing'):
+            self.normalize(self.r1, self.r1_normed)
+            self.normalize(self.r2, self.r2_normed)
+
+        with stage('ranking and geometric means'):
+            np.subtract(self.r1_normed, self.r2_normed, out=self.diff)
+            np.absolute(self.diff, out=self.diff)
+            self.rank(self.r1_normed, p7, q1, self.r1_ranks, self.r1_geo_mean_normed)
+            self.rank(self.r2_normed, p7, q1, self.r2_ranks, self.r2_geo_mean_normed)
+            np.subtract(self.r1_ranks, self.r2_ranks, out=self.diff_ranks)
+            np.absolute(self.diff_ranks, out=self.diff_ranks)
+
+        return {'table': self.columns.T, 'metric': self.diff.sum(), 'metric_rank': self.diff_ranks.sum(),
+                'normed': (self.r1_normed, self.r2_normed)}
+
+    def sample(self, source, rng, out):
+        # get_ranking into out: triangular's inverse CDF, in the same float operations
+        if not isinstance(source, tuple):
+            if np.shape(source) != out.shape:
+                raise ValueError(f"A manual ranking should have {self.size} values")
+            np.copyto(out, source)
+            return
+        a, b, m = source
+        check_triangle(a, b, m)
+        if a == b:
+            out.fill(a)
+            return
+
+        u, left, right, below = self.x, self.y, out, self.flags[0]
+        rng.random(out=u, dtype=self.dtype)
+        np.multiply(u, b - a, out=left)
+        left *= m - a
+        np.sqrt(left, out=left)
+        left += a
+        np.subtract(1, u, out=right)
+        right *= b - a
+        right *= b - m
+        np.sqrt(right, out=right)
+        np.subtract(b, right, out=right)
+        np.less(u, (m - a) / (b - a), out=below)
+        np.copyto(out, left, where=below)
+
+    def normalize(self, r, out):
+        total = r.sum()
+        if total:
+            np.divide(r, total, out=out)
+        else:
+            out.fill(1 / self.size)
+
+    def rank(self, r, p7, q1, ranks, geo_mean_normed):
+        # Tie-averaged ranks from 0 (get_diff_ranks) and the normed geometric means (geo_mean_vector) of r,
+        # which share the sorting
+        n = self.size
+        self.pairs.real = r
+        self.pairs.imag = self.positions
+        self.pairs.sort()
+        np.copyto(self.r_sorted, self.pairs.real)
+        np.copyto(self.order, self.pairs.imag, casting='unsafe')
+
+        is_first, is_last = self.flags[:2]
+        is_first[0] = True
+        np.not_equal(self.r_sorted[1:], self.r_sorted[:-1], out=is_first[1:])
+        is_last[-1] = True
+        is_last[:-1] = is_first[1:]
+        np.multiply(is_first, self.positions, out=self.first)
+        np.maximum.accumulate(self.first, out=self.first)
+        self.last.fill(n - 1)
+        np.copyto(self.last, self.positions, where=is_last)
+        np.minimum.accumulate(self.last[::-1], out=self.last[::-1])
+
+        np.add(self.first, self.last, out=self.index)
+        np.multiply(self.index, .5, out=self.x)
+        np.put(ranks, self.order, self.x)
+
+        geo_mean = self.x
+        dr = self.r_sorted[-1] - self.r_sorted[0]
+        if dr == 0:
+            geo_mean.fill(1)
+        else:
+            self.log_means(dr, 1 - p7, q1, geo_mean)
+            np.exp(geo_mean, out=geo_mean)
+        np.put(geo_mean_normed, self.order, geo_mean)
+        self.normalize(geo_mean_normed, geo_mean_normed)
+
+    def log_means(self, dr, max_th, q1, out):
+        # log_means of the sorted ranking, the counts being those of seven_counts and three_counts
+        n = self.size
+        min_th = min(q1, max_th)
+        n7_pos, n7_neg, n3_pos, n3_neg = self.counts
+        # x being the K-matrix difference (ri - rj) / dr, where the out of the predicates is True:
+        #   pos_7: x > max_th, not_neg_7: -x <= max_th
+        #   pos_3: x > 0 and (x >= q1 or x > max_th), not_neg_3: x >= 0 or (-x < q1 and -x <= max_th)
+        self.count_prefix(dr, -max_th * dr, 'left', n7_pos, lambda x, out, a, b: np.greater(x, max_th, out=out))
+        self.count_prefix(dr, max_th * dr, 'right', n7_neg,
+                          lambda x, out, a, b: np.less_equal(np.negative(x, out=x), max_th, out=out))
+        np.subtract(n, n7_neg, out=n7_neg)
+
+        def pos_3(x, out, a, b):
+            np.greater_equal(x, q1, out=a)
+            a |= np.greater(x, max_th, out=b)
+            np.greater(x, 0, out=out)
+            out &= a
+
+        def not_neg_3(x, out, a, b):
+            np.greater_equal(x, 0, out=out)
+            np.negative(x, out=x)
+            np.less(x, q1, out=a)
+            a &= np.less_equal(x, max_th, out=b)
+            out |= a
+
+        self.count_prefix(dr, -min_th * dr, 'right', n3_pos, pos_3)
+        self.count_prefix(dr, min_th * dr, 'left', n3_neg, not_neg_3)
+        np.subtract(n, n3_neg, out=n3_neg)
+
+        sevens, threes = self.index, self.at
+        np.subtract(n7_pos, n7_neg, out=sevens)
+        np.subtract(n3_pos, n7_pos, out=threes)
+        threes -= n3_neg
+        threes += n7_neg
+        np.multiply(sevens, LOG_7, out=out)
+        np.multiply(threes, LOG_3, out=self.y)
+        out += self.y
+        out /= n
+
+    def count_prefix(self, dr, offset, side, out, predicate):
+        # count_prefix of difference_search: searchsorted(r_sorted, r_sorted + offset, side) moved onto the
+        # exact boundary of predicate, as exact_count does
+        n = self.size
+        np.add(self.r_sorted, offset, out=self.queries)
+        self.searchsorted(self.queries, side, out)
+
+        up, down, valid = self.flags[:3]
+        while True:
+            np.minimum(out, n - 1, out=self.at)
+            self.holds(self.at, dr, predicate, up)
+            up &= np.less(out, n, out=valid)
+            np.subtract(out, 1, out=self.before)
+            np.maximum(self.before, 0, out=self.before)
+            self.holds(self.before, dr, predicate, down)
+            np.logical_not(down, out=down)
+            down &= np.greater(out, 0, out=valid)
+            if not (up.any() or down.any()):
+                return
+            np.take(self.last, self.at, out=self.index, mode='clip')
+            self.index += 1
+            np.copyto(out, self.index, where=up)
+            np.take(self.first, self.before, out=self.index, mode='clip')
+            np.copyto(out, self.index, where=down)
+
+    def holds(self, j, dr, predicate, out):
+        # predicate of (r_sorted - r_sorted[j]) / dr, for every position i and its j[i]
+        # mode='raise' would check the indices in a copy of out
+        np.take(self.r_sorted, j, out=self.y, mode='clip')
+        np.subtract(self.r_sorted, self.y, out=self.y)
+        self.y /= dr
+        predicate(self.y, out, *self.flags[3:])
+
+    def searchsorted(self, queries, side, out):
+        # np.searchsorted(r_sorted, queries, side) of sorted queries. The merged values sort before the
+        # queries equal to them with 'right', after with 'left', by the imaginary part: the index of the query,
+        # or -1 or n for a value, which np.put then writes into the last slot of query_count.
+        n = self.size
+        merged, index, count = self.merged, self.merged_index, self.merged_count
+        merged.real[:n] = self.r_sorted
+        merged.imag[:n] = -1 if side == 'right' else n
+        merged.real[n:] = queries
+        merged.imag[n:] = self.positions
+        merged.sort()
+        np.copyto(index, merged.imag, casting='unsafe')
+        # Values up to each position, accumulated in place as accumulating bools would cast them all first
+        np.equal(index, -1 if side == 'right' else n, out=count)
+        np.cumsum(count, out=count)
+        np.put(self.query_count, index, count)
+        np.copyto(out, self.query_count[:n])
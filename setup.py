@@ -1,8 +1,11 @@
 import sys
 from cx_Freeze import setup, Executable
+from build_ui import compile_ui
+
+compile_ui()
 
 build_exe_options = {
-    'packages': ['pandas', 'PyQt5'],
+    'packages': ['numpy', 'PyQt5', 'rankings'],
     'excludes': ['scipy', 'matplotlib', 'tkinter'],
     'include_files': ['ui/', 'ui/'],
     'include_msvcr': True
@@ -17,4 +20,7 @@ setup(name="Rankings Generator",
       options={'build_exe': build_exe_options},
       executables=[Executable(script='main.py',
                               base=base,
-                              targetName=targetName)])
+                              targetName=targetName),
+                   Executable(script='rankings/__main__.py',
+                              base=None,
+                              targetName='rankings')])
@@ -1,106 +1,94 @@
-from PyQt5.QtWidgets import QTableView, QSizePolicy
+import numpy as np
+from PyQt5.QtWidgets import QTableView, QSizePolicy, QAbstractItemView, QHeaderView, QFrame, QApplication
 from PyQt5.QtCore import QAbstractTableModel, Qt, QVariant, pyqtSignal
 from PyQt5.QtGui import QFont, QBrush
+from rankings.difference_search import ADVANTAGES
+from rankings.timing import timed
 
 
 class PandasModel(QAbstractTableModel):
-    def __init__(self, data):
+    # Keeps the raw values as a 2-D ndarray and formats only the cells Qt asks for. formats is either one
+    # format string for all columns or a list with one per column.
+    def __init__(self, data, formats='{0}', columns=None):
         QAbstractTableModel.__init__(self)
-        self._data = data
+        self.pinned_column = None
+        self._data = np.asarray(data)
+        self._columns = list(range(self._data.shape[1])) if columns is None else list(columns)
+        self._formats = [formats] * len(self._columns) if isinstance(formats, str) else list(formats)
 
     def rowCount(self, parent=None):
-        return len(self._data.values)
+        return self._data.shape[0]
 
     def columnCount(self, parent=None):
-        return self._data.columns.size
+        return self._data.shape[1]
+
+    def format(self, row, col):
+        return self._formats[col].format(self._data[row, col])
 
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
-                return QVariant(str(self._data.iloc[index.row()][index.column()]))
+                return QVariant(self.format(index.row(), index.column()))
         return QVariant()
 
     def headerData(self, col, orientation, role):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
-            return str(self._data.columns[col])
+            return str(self._columns[col])
 
         if orientation == Qt.Vertical and role == Qt.DisplayRole:
-            return str(self._data.index[col])
+            return str(col)
         return None
 
 
 class PandasMainTableModel(PandasModel):
     def rowCount(self, parent=None):
-        return min(len(self._data.values), 11)  # Suppress output and return first 10 rows
+        return min(self._data.shape[0], 11)  # Suppress output and return first 10 rows, see TableWindow
 
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
                 if index.row() >= 10:
                     return QVariant('...')
-                return QVariant(str(self._data.iloc[index.row()][index.column()]))
+                return QVariant(self.format(index.row(), index.column()))
         return QVariant()
 
 
 class AdvantagesTableModel(PandasModel):
-    def rowCount(self, parent=None):
-        return min(len(self._data.values), 11)  # Suppress output and return first 10 rows
+    # The K matrix arrives as int8 codes and is decoded per cell, followed by the G_mean column
+    def __init__(self, data, geo_mean):
+        n = len(geo_mean)
+        super().__init__(data, ['{0:5.2f}'] * n + ['{0:5.4f}'], list(range(n)) + ['G_mean'])
+        self._geo_mean = np.asarray(geo_mean)
+        self.pinned_column = n
 
     def columnCount(self, parent=None):
-        return min(len(self._data.columns), 12)  # Suppress output and return first 10 columns
+        return self._data.shape[1] + 1
 
-    def data(self, index, role=Qt.DisplayRole):
-        if index.isValid():
-            if role == Qt.DisplayRole:
-                if index.row() >= 10:
-                    return QVariant('...')
-                if self.columnCount() == 12:
-                    if index.column() == 10:
-                        return QVariant('...')
-                    if index.column() == 11:
-                        return QVariant(str(self._data.iloc[index.row()]['G_mean']))
-                return QVariant(str(self._data.iloc[index.row(), index.column()]))
-            if role == Qt.TextAlignmentRole:
-                if index.row() == 10 or index.column() >= 10:
-                    return int(Qt.AlignCenter)
-        return QVariant()
-
-    def headerData(self, col, orientation, role):
-        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
-            if col >= 11:
-                col = -1
-            return str(self._data.columns[col])
-
-        if orientation == Qt.Vertical and role == Qt.DisplayRole:
-            return str(self._data.index[col])
-        return None
+    def format(self, row, col):
+        if col == -1 or col == self.pinned_column:
+            return self._formats[-1].format(self._geo_mean[row])
+        return self._formats[col].format(ADVANTAGES[self._data[row, col] + 2])
 
 
 class RightAlignTableModel(PandasModel):
-    def __init__(self, data):
-        super().__init__(data)
-
-    def rowCount(self, parent=None):
-        return min(len(self._data.values), 11)  # Suppress output and return first 10 rows
-
-    def columnCount(self, parent=None):
-        return min(len(self._data.columns), 11)  # Suppress output and return first 10 columns
+    def __init__(self, data, formats='{0:5.4f}'):
+        super().__init__(data, formats)
 
     def data(self, index, role=Qt.DisplayRole):
         if index.isValid():
             if role == Qt.DisplayRole:
-                if index.row() >= 10 or index.column() >= 10:
-                    return QVariant('...')
-                return QVariant(str(self._data.iloc[index.row()][index.column()]))
+                return QVariant(self.format(index.row(), index.column()))
             if role == Qt.TextAlignmentRole:
-                if index.row() >= 10 or index.column() >= 10:
-                    return int(Qt.AlignCenter)
                 return int(Qt.AlignRight)
         return QVariant()
 
 
 class TableWindow(QTableView):
+    # Scrollable viewer for models of any size. Qt only asks for the visible cells, so the column width is
+    # measured on a small sample instead of resizeColumnsToContents, which would format every cell. A model
+    # with a pinned_column keeps that column on the right edge while scrolling horizontally.
     set_model_signal = pyqtSignal()
+    sample_size = 20
 
     def __init__(self, title=None):
         super().__init__()
@@ -109,15 +97,68 @@ class TableWindow(QTableView):
 
         self.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Minimum)
         self.setFont(QFont("MS Shell Dig 2", 14))
-        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.set_model_signal.connect(self.update_size)
 
+        self.pinned_column = None
+        self.pinned = QTableView(self)
+        self.pinned.setFocusPolicy(Qt.NoFocus)
+        self.pinned.setFrameShape(QFrame.NoFrame)
+        self.pinned.verticalHeader().hide()
+        self.pinned.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.pinned.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.pinned.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.pinned.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.pinned.hide()
+        self.verticalScrollBar().valueChanged.connect(self.pinned.verticalScrollBar().setValue)
+        self.pinned.verticalScrollBar().valueChanged.connect(self.verticalScrollBar().setValue)
+        self.horizontalScrollBar().rangeChanged.connect(self.update_pinned_geometry)
+
     def setModel(self, model):
         super().setModel(model)
+        self.pinned_column = getattr(model, 'pinned_column', None)
+        if self.pinned_column is not None:
+            self.pinned.setModel(model)
+            self.pinned.setSelectionModel(self.selectionModel())
+            for col in range(model.columnCount()):
+                self.pinned.setColumnHidden(col, col != self.pinned_column)
         self.set_model_signal.emit()
 
+    @timed
     def update_size(self):
-        self.resizeColumnsToContents()
-        self.setFixedSize(self.horizontalHeader().length() + self.verticalHeader().width(),
-                          self.verticalHeader().length() + self.horizontalHeader().height())
+        model = self.model()
+        rows, cols = model.rowCount(), model.columnCount()
+        sample_rows = range(min(rows, self.sample_size))
+        sample_cols = sorted({*range(min(cols, self.sample_size)), cols - 1})
+        texts = [model.format(row, col) for row in sample_rows for col in sample_cols]
+        texts += [model.headerData(col, Qt.Horizontal, Qt.DisplayRole) for col in sample_cols]
+        width = max(self.fontMetrics().horizontalAdvance(text) for text in texts) + 16
+        self.horizontalHeader().setDefaultSectionSize(width)
+        self.pinned.horizontalHeader().setDefaultSectionSize(width)
+        self.pinned.verticalHeader().setDefaultSectionSize(self.verticalHeader().defaultSectionSize())
+
+        available = QApplication.primaryScreen().availableGeometry()
+        frame = 2 * self.frameWidth()
+        content_width = self.verticalHeader().width() + cols * width + self.verticalScrollBar().sizeHint().width()
+        content_height = (self.horizontalHeader().height() + rows * self.verticalHeader().defaultSectionSize()
+                          + self.horizontalScrollBar().sizeHint().height())
+        self.resize(min(content_width + frame, available.width() * 4 // 5),
+                    min(content_height + frame, available.height() * 4 // 5))
+        self.update_pinned_geometry()
+
+    def update_pinned_geometry(self):
+        # The pinned copy is only needed while its column can be scrolled out of view
+        if self.pinned_column is None or self.horizontalScrollBar().maximum() == 0:
+            self.pinned.hide()
+            return
+
+        width = self.columnWidth(self.pinned_column)
+        self.pinned.setGeometry(self.frameWidth() + self.verticalHeader().width() + self.viewport().width() - width,
+                                self.frameWidth(), width, self.horizontalHeader().height() + self.viewport().height())
+        self.pinned.show()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_pinned_geometry()
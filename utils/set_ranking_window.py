@@ -1,184 +1,274 @@
 import numpy as np
-from PyQt5.QtWidgets import (QHBoxLayout, QVBoxLayout, QLabel, QPushButton, QSizePolicy,
-                             QWidget, QSlider, QFrame, QLineEdit, QGridLayout)
-from PyQt5.QtCore import Qt, pyqtSignal, QRegExp
-from PyQt5.QtGui import QFont, QResizeEvent, QRegExpValidator
-from .helpers import get_float
-
-
-class CustomSlider(QSlider):
-    resized = pyqtSignal(QResizeEvent)
-
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.setTickPosition(QSlider.TicksBelow)
-        self.resized.connect(self.some)
-        self.abs_value = .5
-
-    def resizeEvent(self, e):
-        self.resized.emit(e)
-        return super().resizeEvent(e)
-
-    def mousePressEvent(self, e):
-        self.moveByEvent(e)
-
-    def mouseMoveEvent(self, e):
-        self.moveByEvent(e)
-
-    def moveByEvent(self, e):
-        e.accept()
-        x = e.pos().x()
-        value = (self.maximum() - self.minimum()) * x / self.width() + self.minimum()
-        self.abs_value = round(value / self.width(), 3)
-
-        if self.abs_value > 1:
-            self.abs_value = 1
-        elif self.abs_value < 0:
-            self.abs_value = 0
-
-        self.setValue(round(value))
-
-    def some(self, event):
-        old_width, width = event.oldSize().width(), event.size().width()
-        self.setRange(0, width)
-        self.setPageStep(1)
-        self.setTickInterval(width / 2)
-        if old_width == -1:
-            self.setValue(width / 2)
-        else:
-            self.setValue(width * self.abs_value)
+from PyQt5.QtWidgets import (QVBoxLayout, QPushButton, QSizePolicy, QWidget, QTableView, QHeaderView, QLineEdit,
+                             QStyledItemDelegate, QStyleOptionSlider, QStyle, QSlider, QAbstractItemView,
+                             QApplication)
+from PyQt5.QtCore import Qt, pyqtSignal, QRegExp, QAbstractTableModel, QModelIndex, QVariant, QTimer
+from PyQt5.QtGui import QFont, QRegExpValidator
+from rankings.helpers import get_float
+
+NORMED_PATTERN = r'(0([\.|,]\d{1,4})?|1([\.|,]0{1,4})?)'
+SLIDER_STEPS = 1000  # slider values are kept to 3 decimals
+VISIBLE_ROWS = 20  # rows a ranking window shows before it scrolls
+
+
+def set_normed_value(values, i, normed):
+    # Slider values for which alternative i has the normed value, the others keeping their proportions
+    values = values.copy()
+    others = np.delete(values, i).sum()
+    if normed == 1:
+        values[:] = 0
+        values[i] = 1.
+    elif others or not normed:
+        values[i] = round(others * normed / (1 - normed), 3)
+    else:
+        values[:] = (1 - normed) / (normed * (len(values) - 1))
+        values[i] = 1.
+    if values.max() > 1:
+        values /= values.max()
+    return values
+
+
+class RankingModel(QAbstractTableModel):
+    # The values of the alternatives of a ranking window, in one array that grows with the size and keeps the
+    # values of alternatives hidden by a smaller size. The views only ask for their visible rows, so any
+    # number of alternatives costs the same to show, and an edit of many values is one dataChanged.
+    columns = []
+    default = 0.
+
+    def __init__(self):
+        super().__init__()
+        self.values = np.empty(0)
+        self.size = 0
 
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.size
 
-class BaseAlternativeWidget(QFrame):
-    text_changed = pyqtSignal(QFrame)
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
 
-    def __init__(self, i):
-        super().__init__()
-        font = QFont("MS Shell Dig 2", 14)
-        self.layout = QHBoxLayout()
-        self.setLayout(self.layout)
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return QVariant()
+        return self.columns[section] if orientation == Qt.Horizontal else f'a{section}'
 
-        self.i = i
-        self.label = QLabel(f'a{i}')
-        self.label.setFont(font)
+    def flags(self, index):
+        return super().flags(index) | Qt.ItemIsEditable
 
-        self.value_label = QLineEdit()
-        self.value_label.setValidator(QRegExpValidator(QRegExp(r'(0([\.|,]\d{1,4})?|1([\.|,]0{1,4})?)')))
-        self.value_label.setFont(font)
-        self.value_label.setFixedWidth(110)
+    def set_size(self, size):
+        self.beginResetModel()
+        if size > len(self.values):
+            self.values = np.concatenate([self.values, np.full(size - len(self.values), self.default)])
+        self.size = size
+        self.update()
+        self.endResetModel()
+
+    def set_values(self, values):
+        self.values[:self.size] = values
+        self.changed()
+
+    def changed(self):
+        self.update()
+        self.dataChanged.emit(self.index(0, 0), self.index(self.size - 1, len(self.columns) - 1))
+
+    def update(self):
+        pass
+
+
+class VisualRankingModel(RankingModel):
+    # Slider values in [0, 1], shown with their normed values. Setting the normed value of an alternative
+    # moves its slider, or all of them when the others can't make up the rest.
+    columns = ['Value', 'Normed']
+    default = .5
+
+    def update(self):
+        values = self.values[:self.size]
+        total = values.sum()
+        self.normed = values / total if total else np.ones(self.size) / self.size
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if index.column() == 0:
+            return float(self.values[index.row()]) if role == Qt.EditRole else QVariant()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return f'{self.normed[index.row()]:.4f}'
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return QVariant()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole:
+            return False
+        if index.column() == 0:
+            self.values[index.row()] = value
+        else:
+            self.values[:self.size] = set_normed_value(self.values[:self.size], index.row(),
+                                                       round(get_float(value), 4))
+        self.changed()
+        return True
+
+
+class ManualRankingModel(RankingModel):
+    # Normed values typed in one by one, applied to the sliders by the Update button
+    columns = ['Normed']
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return f'{self.values[index.row()]:.4f}'
+        if role == Qt.TextAlignmentRole:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return QVariant()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole:
+            return False
+        self.values[index.row()] = get_float(value)
+        self.dataChanged.emit(index, index)
+        return True
+
+
+class SliderDelegate(QStyledItemDelegate):
+    # Paints values in [0, 1] as sliders, which RankingView moves with the mouse
+    def paint(self, painter, option, index):
+        slider = QStyleOptionSlider()
+        slider.rect = option.rect.adjusted(8, 0, -8, 0)
+        slider.palette = option.palette
+        slider.state = option.state
+        slider.orientation = Qt.Horizontal
+        slider.minimum, slider.maximum = 0, SLIDER_STEPS
+        slider.sliderPosition = slider.sliderValue = round(index.data(Qt.EditRole) * SLIDER_STEPS)
+        slider.tickPosition = QSlider.TicksBelow
+        slider.tickInterval = SLIDER_STEPS // 2
+        slider.subControls = QStyle.SC_SliderGroove | QStyle.SC_SliderHandle | QStyle.SC_SliderTickmarks
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawComplexControl(QStyle.CC_Slider, slider, painter, option.widget)
+
+    def createEditor(self, parent, option, index):
+        return None
+
+
+class NormedDelegate(QStyledItemDelegate):
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setValidator(QRegExpValidator(QRegExp(NORMED_PATTERN), editor))
+        return editor
+
+
+class RankingView(QTableView):
+    # One row per alternative. The row of slider_column grabbed by a press follows the mouse until the release,
+    # like a slider would.
+    def __init__(self, model, slider_column=None):
+        super().__init__()
+        self.setModel(model)
+        self.slider_column = slider_column
+        self.grabbed = None
+        self.setFont(QFont("MS Shell Dig 2", 14))
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed
+                             | QAbstractItemView.AnyKeyPressed)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+
+    def mousePressEvent(self, event):
+        index = self.indexAt(event.pos())
+        if event.button() == Qt.LeftButton and index.isValid() and index.column() == self.slider_column:
+            self.grabbed = index
+            self.move_slider(event.pos())
+        else:
+            super().mousePressEvent(event)
 
-        self.layout.addWidget(self.label)
-        self.layout.addWidget(self.value_label)
+    def mouseMoveEvent(self, event):
+        if self.grabbed is not None:
+            self.move_slider(event.pos())
+        else:
+            super().mouseMoveEvent(event)
 
-        self.value_label.editingFinished.connect(lambda: self.text_changed.emit(self))
+    def mouseReleaseEvent(self, event):
+        if self.grabbed is not None:
+            self.grabbed = None
+        else:
+            super().mouseReleaseEvent(event)
 
+    def move_slider(self, pos):
+        rect = self.visualRect(self.grabbed).adjusted(8, 0, -8, 0)
+        value = (pos.x() - rect.left()) / max(rect.width(), 1)
+        self.model().setData(self.grabbed, round(min(max(value, 0.), 1.), 3))
 
-class VisualAlternativeWidget(BaseAlternativeWidget):
-    def __init__(self, i):
-        super().__init__(i)
-        self.slider = CustomSlider(Qt.Horizontal)
-        self.slider.setFocusPolicy(Qt.NoFocus)
-        self.layout.insertWidget(self.layout.count() - 1, self.slider)
+    def fit_height(self):
+        rows = min(self.model().rowCount(), VISIBLE_ROWS)
+        return (self.horizontalHeader().height() + rows * self.verticalHeader().defaultSectionSize()
+                + 2 * self.frameWidth())
 
 
 class VisualRankingWindow(QWidget):
+    # values_updated is emitted once per event loop iteration in which the values changed, however many
+    # changes it had, e.g. the moves of a drag or the rescaling of every slider by a normed value
     values_updated = pyqtSignal(QWidget)
 
-    def __init__(self, size=10, window_title=None, max_alternatives=10):
+    def __init__(self, size=10, window_title=None):
         super().__init__()
         if window_title is not None:
             self.setWindowTitle(window_title)
 
-        self.size = size
+        self.model = VisualRankingModel()
+        self.view = RankingView(self.model, slider_column=0)
+        self.view.setItemDelegateForColumn(0, SliderDelegate(self.view))
+        self.view.setItemDelegateForColumn(1, NormedDelegate(self.view))
+        self.view.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        # A fixed width, as fitting the contents would measure every row on each change
+        self.view.horizontalHeader().setSectionResizeMode(1, QHeaderView.Fixed)
+        self.view.setColumnWidth(1, self.view.fontMetrics().horizontalAdvance('Normed') + 32)
         self.layout = QVBoxLayout()
+        self.layout.addWidget(self.view)
         self.setLayout(self.layout)
-        self.resize(1000, self.height())
-        self.max_alternatives = max_alternatives
-        self.create_alternatives()
-
-        self.alternatives = [self.layout.itemAt(i).widget() for i in range(max_alternatives)]
-        self.sliders = [a.slider for a in self.alternatives]
-        self.value_labels = [a.value_label for a in self.alternatives]
 
-        for slider in self.sliders:
-            slider.valueChanged.connect(self.update_values)
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(0)
+        self.update_timer.timeout.connect(self.update_values)
+        self.model.dataChanged.connect(lambda: self.update_timer.start())
+        self.model.modelReset.connect(lambda: self.update_timer.start())
 
-        for a in self.alternatives:
-            a.text_changed.connect(self.label_text)
+        self.update_size(size)
 
-        self.update_values()
+    @property
+    def size(self):
+        return self.model.size
 
-    def label_text(self, alternative):
-        n_v = round(float(alternative.value_label.text()), 4)
-        other_alternatives = self.alternatives[:alternative.i] + self.alternatives[alternative.i + 1:self.size]
-        other_values = np.array([a.slider.abs_value for a in other_alternatives])
+    def values(self):
+        return self.model.values[:self.size].copy()
 
-        if n_v == 1.0:
-            for a in self.alternatives[:self.size]:
-                a.slider.abs_value = 0
-                a.slider.setValue(0)
-            alternative.slider.abs_value = 1.0
-        else:
-            if np.sum(other_values / n_v):
-                alternative.slider.abs_value = round(np.sum(other_values * n_v) / (1 - n_v), 3)
-            else:
-                pivot = (1 - n_v) / (n_v * (self.size - 1))
-                for a in self.alternatives[:self.size]:
-                    a.slider.abs_value = pivot
-                    a.slider.setValue(a.slider.abs_value * a.slider.width())
-                alternative.slider.abs_value = 1.0
+    def normed_values(self):
+        return self.model.normed.copy()
 
-        alternative.slider.setValue(round(alternative.slider.width() * alternative.slider.abs_value))
-
-        if alternative.slider.abs_value > 1.0:
-            pivot = alternative.slider.abs_value
-            for a in self.alternatives[:self.size]:
-                a.slider.abs_value = a.slider.abs_value / pivot
-                a.slider.setValue(a.slider.abs_value * a.slider.width())
-
-        self.update_values()
+    def set_values(self, values):
+        self.model.set_values(values)
 
     def update_values(self):
-        values = np.array([s.abs_value for s in self.sliders[:self.size]])
-        sum_values = sum(values)
-        normed_values = values / sum_values if sum_values else np.ones(self.size) / self.size
-        for i, value in enumerate(normed_values):
-            self.value_labels[i].setText(f'{value:.4f}')
-
+        self.update_timer.stop()
         self.values_updated.emit(self)
 
-    def create_alternatives(self):
-        for i in range(self.max_alternatives):
-            self.layout.addWidget(VisualAlternativeWidget(i))
-
     def update_size(self, size):
-        self.size = size
-        for i in range(size):
-            self.layout.itemAt(i).widget().show()
-
-        for i in range(size, self.max_alternatives):
-            self.layout.itemAt(i).widget().hide()
-
-        self.update_values()
+        self.model.set_size(size)
+        self.resize(1000, self.view.fit_height() + self.layout.contentsMargins().top()
+                    + self.layout.contentsMargins().bottom())
 
 
 class ManualRankingWindow(QWidget):
-    def __init__(self, size=10, window_title=None, max_alternatives=10):
+    def __init__(self, size=10, window_title=None):
         super().__init__()
         if window_title is not None:
             self.setWindowTitle(window_title)
 
-        self.setFixedSize(0, 0)
-        self.size = size
-        self.max_alternatives = max_alternatives
-        self.alternatives = []
-        self.normed_values = np.ones(self.max_alternatives) / self.max_alternatives
-
+        self.model = ManualRankingModel()
+        self.view = RankingView(self.model)
+        self.view.setItemDelegate(NormedDelegate(self.view))
+        self.view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.layout = QVBoxLayout()
-        self.alternatives_layout = QGridLayout()
-        self.layout.addLayout(self.alternatives_layout)
+        self.layout.addWidget(self.view)
         self.setLayout(self.layout)
-        self.create_alternatives()
 
         font = QFont()
         font.setPointSize(14)
@@ -187,23 +277,19 @@ class ManualRankingWindow(QWidget):
         self.button.setFont(font)
         self.layout.addWidget(self.button, alignment=Qt.AlignRight)
 
-    def create_alternatives(self):
-        for i in range(self.max_alternatives):
-            alternative = BaseAlternativeWidget(i)
-            alternative.text_changed.connect(self.update_normed)
-            self.alternatives.append(alternative)
-            self.alternatives_layout.addWidget(alternative, i // 5, i % 5)
+        self.update_size(size)
 
-    def update_normed(self, alternative):
-        self.normed_values[alternative.i] = get_float(alternative.value_label.text())
+    @property
+    def size(self):
+        return self.model.size
 
-    def update_size(self, size):
-        self.size = size
-        for i in range(size):
-            self.alternatives_layout.itemAt(i).widget().show()
+    def normed_values(self):
+        return self.model.values[:self.size].copy()
 
-        for i in range(size, self.max_alternatives):
-            self.alternatives_layout.itemAt(i).widget().hide()
+    def set_normed_values(self, values):
+        self.model.set_values(values)
 
-        self.adjustSize()
-        self.resize(0, 0)
+    def update_size(self, size):
+        self.model.set_size(size)
+        self.resize(300, self.view.fit_height() + self.button.sizeHint().height() + 3 * self.layout.spacing()
+                    + self.layout.contentsMargins().top() + self.layout.contentsMargins().bottom())
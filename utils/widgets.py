@@ -0,0 +1,6 @@
+def change_visibility(elements, state):
+    for element in elements:
+        if state:
+            element.show()
+        else:
+            element.hide()
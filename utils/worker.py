@@ -0,0 +1,65 @@
+import sys
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from rankings.timing import recording
+
+
+# Jobs are owned by Python, so a job dropped by its caller while the thread pool still has it queued or running
+# would be deleted under it. Started jobs are kept here until their run returns.
+RUNNING = set()
+
+
+class Cancelled(Exception):
+    pass
+
+
+class JobSignals(QObject):
+    progress = pyqtSignal(object, int, int, str)
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+
+
+class Job(QRunnable):
+    # Runs function(*args, report=...) on a thread pool. The function calls report(step, steps, stage) between
+    # stages, which is also where a cancelled job stops. Signals carry the job so that the receiver can drop
+    # results of jobs that were superseded in the meantime. Stages run by the function are recorded into timings.
+    def __init__(self, function, *args, timings=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.function = function
+        self.args = args
+        self.timings = timings
+        self.cancelled = False
+        self.signals = JobSignals()
+
+    def start(self, thread_pool):
+        RUNNING.add(self)
+        thread_pool.start(self)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, step, steps, stage):
+        if self.cancelled:
+            raise Cancelled()
+        self.signals.progress.emit(self, step, steps, stage)
+
+    def run(self):
+        try:
+            self.run_function()
+        finally:
+            RUNNING.discard(self)
+
+    def run_function(self):
+        try:
+            if self.timings is None:
+                result = self.function(*self.args, report=self.report)
+            else:
+                with recording(self.timings):
+                    result = self.function(*self.args, report=self.report)
+        except Cancelled:
+            return
+        except Exception:
+            self.signals.failed.emit(self, sys.exc_info())
+            return
+        if not self.cancelled:
+            self.signals.finished.emit(self, result)